@@ -17,6 +17,7 @@ def main():
     print("[2] Update Model: Sync Manual Labels + Fine-tune (Local CPU)")
     print("[3] Update Model: Sync Manual Labels + Fine-tune (Kaggle GPU)")
     print("[4] Advanced: Just Sync Data (No training)")
+    print("[5] Live Mode: Classify New Emails as They Arrive")
     print("[Q] Quit")
     
     choice = input("\nSelect an option: ").strip().lower()
@@ -51,6 +52,10 @@ def main():
         print("\nPhase: Syncing Labels and Preparing Dataset...")
         run_step(['python', 'scripts/collect_data.py'])
 
+    elif choice == '5':
+        print("\nPhase: Watching for New Emails (Ctrl-C to stop)...")
+        run_step(['python', 'scripts/watch_emails.py'])
+
     elif choice == 'q':
         sys.exit(0)
     else:
@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import base64
+import argparse
+import numpy as np
+
+# --- Configuration ---
+AL_DIR = os.path.join('state', 'active_learning')
+USERS_STATE_DIR = os.path.join('state', 'users')  # multi_classify mailboxes: <user>/active_learning/
+QUEUE_FILE = 'queue.jsonl'          # One line per prediction
+REQUESTS_FILE = 'requests.json'     # Latest top-k asked to be hand-labelled
+COLLECTED_FILE = 'collected.txt'    # Ids already turned into training rows
+DEFAULT_TOP_K = 20
+QUEUE_MAX_AGE_DAYS = 30  # Predictions queued longer ago are dropped when the queue is compacted
+
+def encode_embedding(embedding):
+    # float16 + base64 keeps a 768-d embedding around 2 KB per queue line
+    return base64.b64encode(np.asarray(embedding, dtype=np.float16).tobytes()).decode('ascii')
+
+def decode_embedding(data):
+    return np.frombuffer(base64.b64decode(data), dtype=np.float16).astype(np.float32)
+
+def normalize(matrix):
+    return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-8, None)
+
+def uncertainty(probs):
+    """Margin-based uncertainty: 1.0 when the two classes tie, 0.0 when the model is certain."""
+    top2 = np.sort(np.asarray(probs))[-2:]
+    return float(1.0 - (top2[-1] - top2[0]))
+
+def user_dir(user):
+    """The active-learning dir of one multi_classify mailbox."""
+    return os.path.join(USERS_STATE_DIR, user, 'active_learning')
+
+def load_queue(al_dir=AL_DIR):
+    path = os.path.join(al_dir, QUEUE_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def write_queue(queue, al_dir=AL_DIR):
+    path = os.path.join(al_dir, QUEUE_FILE)
+    with open(path + '.tmp', 'w') as f:
+        f.write(''.join(json.dumps(q) + '\n' for q in queue))
+    os.replace(path + '.tmp', path)
+
+def compact_queue(queue):
+    """Keeps the latest entry per id and drops entries queued more than QUEUE_MAX_AGE_DAYS ago."""
+    cutoff = time.time() - QUEUE_MAX_AGE_DAYS * 86400
+    latest = {}
+    for q in queue:
+        # Entries written before queued_at was recorded fall back to the email's own date
+        if q.get('queued_at', q['internal_ts'] / 1000) >= cutoff:
+            latest.pop(q['id'], None)
+            latest[q['id']] = q
+    return list(latest.values())
+
+def load_collected(al_dir=AL_DIR):
+    path = os.path.join(al_dir, COLLECTED_FILE)
+    if not os.path.exists(path):
+        return set()
+    with open(path, 'r') as f:
+        return set(f.read().split())
+
+def record_predictions(records, al_dir=AL_DIR):
+    """
+    Appends predictions to the queue with a diversity score: the cosine distance from
+    each email to its nearest neighbour among everything queued before it. The queue is
+    compacted first, and an email classified again replaces its earlier entry.
+    """
+    if not records:
+        return
+    if not os.path.exists(al_dir):
+        os.makedirs(al_dir)
+
+    new_ids = {r['id'] for r in records}
+    queued = [q for q in compact_queue(load_queue(al_dir)) if q['id'] not in new_ids]
+    write_queue(queued, al_dir)
+
+    batch = normalize(np.stack([np.asarray(r['embedding'], dtype=np.float32) for r in records]))
+    # Similarity to earlier queue entries, and to earlier emails within this batch
+    nearest = np.full(len(records), -np.inf)
+    if queued:
+        known = np.stack([decode_embedding(q['embedding']) for q in queued])
+        nearest = np.max(known @ batch.T, axis=0)
+    within = batch @ batch.T
+    within[np.tril_indices(len(records))] = -np.inf
+    nearest = np.maximum(nearest, within.max(axis=0))
+    # The very first email has nothing to compare against and counts as fully novel
+    diversity = np.where(np.isinf(nearest), 1.0, 1.0 - nearest)
+
+    queued_at = int(time.time())
+    with open(os.path.join(al_dir, QUEUE_FILE), 'a') as f:
+        for r, embedding, div in zip(records, batch, diversity):
+            f.write(json.dumps({
+                'id': r['id'],
+                'subject': r['subject'],
+                'internal_ts': r['internal_ts'],
+                'label': r['label'],
+                'probs': [round(p, 4) for p in r['probs']],
+                'uncertainty': round(uncertainty(r['probs']), 4),
+                'diversity': round(float(div), 4),
+                'embedding': encode_embedding(embedding),
+                'queued_at': queued_at
+            }) + '\n')
+
+def rank(k=DEFAULT_TOP_K, al_dir=AL_DIR):
+    """
+    Picks the k queued emails most worth labelling. Greedy selection scores each
+    candidate by uncertainty x distance to the closest email already picked (its stored
+    diversity score before anything is picked), so near-duplicates are not all chosen.
+    """
+    collected = load_collected(al_dir)
+    candidates = [q for q in compact_queue(load_queue(al_dir)) if q['id'] not in collected]
+    if not candidates:
+        return []
+
+    embeddings = normalize(np.stack([decode_embedding(c['embedding']) for c in candidates]))
+    unc = np.array([c['uncertainty'] for c in candidates])
+    distance = np.array([c['diversity'] for c in candidates])
+
+    picked = []
+    for _ in range(min(k, len(candidates))):
+        scores = unc * distance
+        scores[picked] = -1
+        best = int(np.argmax(scores))
+        picked.append(best)
+        distance = np.minimum(distance, 1.0 - embeddings @ embeddings[best])
+
+    requests = [{
+        'id': candidates[i]['id'],
+        'subject': candidates[i]['subject'],
+        'applied_label': candidates[i]['label'],  # What the classifier put on it in Gmail
+        'uncertainty': candidates[i]['uncertainty'],
+        'diversity': candidates[i]['diversity']
+    } for i in picked]
+    with open(os.path.join(al_dir, REQUESTS_FILE), 'w') as f:
+        json.dump(requests, f, indent=2)
+    return requests
+
+def load_requests(al_dir=AL_DIR):
+    path = os.path.join(al_dir, REQUESTS_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def mark_collected(ids, al_dir=AL_DIR):
+    """Records ids turned into training rows and drops them from the queue and requests."""
+    if not ids:
+        return
+    ids = set(ids)
+    with open(os.path.join(al_dir, COLLECTED_FILE), 'a') as f:
+        f.write(''.join(f'{i}\n' for i in sorted(ids)))
+
+    write_queue([q for q in load_queue(al_dir) if q['id'] not in ids], al_dir)
+
+    pending = [r for r in load_requests(al_dir) if r['id'] not in ids]
+    with open(os.path.join(al_dir, REQUESTS_FILE), 'w') as f:
+        json.dump(pending, f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank classified emails by how much labelling them would help.")
+    parser.add_argument('--k', type=int, default=DEFAULT_TOP_K, help="Number of emails to request labels for")
+    parser.add_argument('--user', help="Rank a multi_classify mailbox's queue instead of the main one")
+    args = parser.parse_args()
+
+    requests = rank(args.k, user_dir(args.user) if args.user else AL_DIR)
+    if not requests:
+        print(f"The active-learning queue is empty. Run scripts/{'multi_classify' if args.user else 'classify_emails'}.py first.")
+        return
+
+    print(f"🏷️ Top {len(requests)} emails worth labelling by hand:")
+    for r in requests:
+        print(f"  - '{r['subject']}' (labelled {r['applied_label']}, uncertainty {r['uncertainty']:.2f}, diversity {r['diversity']:.2f})")
+    print("\nIn Gmail, add the correct 'Application_Confirmation' or 'Rejected' label where the prediction is wrong "
+          f"or 'Uncertain', then run: python scripts/collect_data.py --corrections{f' --user {args.user}' if args.user else ''}")
+
+if __name__ == '__main__':
+    main()
@@ -62,5 +62,15 @@ with col4:
     fig_rej = px.bar(rej_df, x='date_only', y='count', color_discrete_sequence=['#FF5252'])
     st.plotly_chart(fig_rej, use_container_width=True)
 
+# 4. Classifier throughput per run (written by extract_metrics from the run records)
+history_file = os.path.join('data', 'run_history.csv')
+if os.path.exists(history_file):
+    st.markdown("---")
+    st.subheader("⚡ Classifier Throughput per Run")
+    history_df = pd.read_csv(history_file, parse_dates=['run_at'])
+    fig_speed = px.line(history_df, x='run_at', y='emails_per_s', markers=True, hover_data=['messages'],
+                        labels={"run_at": "Run", "emails_per_s": "Emails / second"})
+    st.plotly_chart(fig_speed, use_container_width=True)
+
 st.markdown("---")
 st.caption("Dashboard updated automatically via your local Gmail sync pipeline.")
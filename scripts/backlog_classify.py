@@ -0,0 +1,194 @@
+import os
+import json
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Importing classify_emails loads the model once for the whole backlog
+import classify_emails as ce
+
+# --- Configuration ---
+BACKLOG_DIR = os.path.join('state', 'backlog')
+CHECKPOINT_FILE = os.path.join(BACKLOG_DIR, 'checkpoint.json')
+IDS_FILE = os.path.join(BACKLOG_DIR, 'ids.txt')
+# Unclassified mail someone sent us: our own sent mail and drafts are never job replies
+DEFAULT_QUERY = '-label:Application_Confirmation -label:Rejected -label:Uncertain -in:sent -in:draft'
+CHUNK_SIZE = 200     # Messages classified and checkpointed together
+FETCH_WORKERS = 8    # Concurrent messages.get calls per chunk
+LIST_PAGE_SIZE = 500 # Maximum allowed by messages.list
+
+def build_query(query, after=None, before=None):
+    parts = [query]
+    if after: parts.append(f'after:{after}')
+    if before: parts.append(f'before:{before}')
+    return ' '.join(p for p in parts if p)
+
+def save_checkpoint(checkpoint):
+    """Writes the checkpoint atomically so a crash never leaves a half-written file."""
+    tmp_path = CHECKPOINT_FILE + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, CHECKPOINT_FILE)
+
+def load_checkpoint(query, dry_run, reset=False):
+    """
+    Resumes the checkpoint of the same query and DRY_RUN setting, so a real run never
+    skips ids that a dry run only pretended to label.
+    """
+    if not reset and os.path.exists(CHECKPOINT_FILE):
+        with open(CHECKPOINT_FILE, 'r') as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('query') == query and checkpoint.get('dry_run') == dry_run:
+            checkpoint.setdefault('failed_ids', [])
+            print(f"♻️ Resuming backlog: {checkpoint['ids_done']}/{checkpoint['ids_listed']} done.")
+            return checkpoint
+        print("⚠️ Existing checkpoint is for a different query or DRY_RUN setting. Starting over.")
+
+    if os.path.exists(IDS_FILE):
+        os.remove(IDS_FILE)
+    return {
+        'query': query,
+        'dry_run': dry_run,
+        'page_token': None,
+        'listing_complete': False,
+        'ids_listed': 0,
+        'ids_done': 0,
+        'failed_ids': [],  # Could not be fetched; retried before the run reports completion
+        'counts': {"Application_Confirmation": 0, "Rejected": 0, "Uncertain": 0}
+    }
+
+def read_ids(checkpoint):
+    """Reads the committed id list, dropping any ids appended after the last checkpoint."""
+    if not os.path.exists(IDS_FILE):
+        return []
+    with open(IDS_FILE, 'r') as f:
+        ids = f.read().split()
+    if len(ids) > checkpoint['ids_listed']:
+        ids = ids[:checkpoint['ids_listed']]
+        with open(IDS_FILE, 'w') as f:
+            f.write(''.join(f'{i}\n' for i in ids))
+    return ids
+
+def list_all_ids(service, checkpoint):
+    """
+    Lists the ids matching the query before anything is labelled, so the result set
+    cannot shift under our page tokens. Each page is checkpointed as it arrives.
+    """
+    while not checkpoint['listing_complete']:
+        results = service.users().messages().list(
+            userId='me', q=checkpoint['query'], pageToken=checkpoint['page_token'], maxResults=LIST_PAGE_SIZE
+        ).execute()
+        page_ids = [m['id'] for m in results.get('messages', [])]
+        with open(IDS_FILE, 'a') as f:
+            f.write(''.join(f'{i}\n' for i in page_ids))
+            f.flush()
+            os.fsync(f.fileno())
+
+        checkpoint['ids_listed'] += len(page_ids)
+        checkpoint['page_token'] = results.get('nextPageToken')
+        checkpoint['listing_complete'] = checkpoint['page_token'] is None
+        save_checkpoint(checkpoint)
+        print(f"📃 Listed {checkpoint['ids_listed']} messages...")
+
+_thread_local = threading.local()
+
+def fetch_candidate(msg_id):
+    """(id, subject, text, internal_ts) of one message, or None if it could not be fetched."""
+    # httplib2 is not thread-safe, so every fetch thread keeps its own service
+    if not hasattr(_thread_local, 'service'):
+        _thread_local.service = ce.get_gmail_service()
+    try:
+        msg = _thread_local.service.users().messages().get(userId='me', id=msg_id).execute()
+        subject, full_text = ce.get_subject_and_text(msg)
+        return msg_id, subject, full_text, int(msg.get('internalDate', 0))
+    except Exception as e:
+        print(f"Error fetching message {msg_id}: {e}")
+        return None
+
+def classify_chunk(service, pool, chunk_ids, workers, mark_read):
+    """
+    Classifies and labels one chunk, then records it like any other classification run.
+    Returns the counts per label and the ids that could not be fetched.
+    """
+    fetched = list(pool.map(fetch_candidate, chunk_ids))
+    candidates = [c for c in fetched if c]
+    failed = [msg_id for msg_id, c in zip(chunk_ids, fetched) if not c]
+
+    latencies = []
+    predictions = ce.predict_parallel([c[2] for c in candidates], workers=workers, with_details=True, latencies=latencies)
+    results = ce.build_results(candidates, predictions, latencies)
+
+    if not ce.DRY_RUN:
+        for label, ids in results.groupby('label')['id']:
+            ce.apply_label_batch(service, ids.tolist(), label, mark_read=mark_read)
+    ce.record_run(results, ce.queue_records(candidates, predictions, results['label']))
+    return {label: int(n) for label, n in results['label'].value_counts().items()}, failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify a mailbox backlog in resumable chunks.")
+    parser.add_argument('--query', default=DEFAULT_QUERY, help="Gmail search query (default: all unclassified received mail)")
+    parser.add_argument('--after', help="Only mail after this date (YYYY/MM/DD)")
+    parser.add_argument('--before', help="Only mail before this date (YYYY/MM/DD)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="CPU workers for inference")
+    parser.add_argument('--mark-read', action='store_true', help="Also mark backlog messages as read")
+    parser.add_argument('--reset', action='store_true', help="Ignore any existing checkpoint")
+    args = parser.parse_args()
+
+    service = ce.get_gmail_service()
+    if not service: return
+    ce.ensure_labels_exist(service)
+
+    if not os.path.exists(BACKLOG_DIR):
+        os.makedirs(BACKLOG_DIR)
+
+    query = build_query(args.query, args.after, args.before)
+    print(f"🔎 Backlog query: {query}")
+    checkpoint = load_checkpoint(query, ce.DRY_RUN, reset=args.reset)
+    read_ids(checkpoint)  # Drops ids listed after the last checkpoint before appending more
+
+    list_all_ids(service, checkpoint)
+    ids = read_ids(checkpoint)
+
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        while checkpoint['ids_done'] < len(ids):
+            start = checkpoint['ids_done']
+            chunk_ids = ids[start:start + args.chunk_size]
+            chunk_counts, failed = classify_chunk(service, pool, chunk_ids, args.workers, args.mark_read)
+
+            for label, n in chunk_counts.items():
+                checkpoint['counts'][label] += n
+            checkpoint['failed_ids'] += failed
+            checkpoint['ids_done'] = start + len(chunk_ids)
+            save_checkpoint(checkpoint)
+            print(f"✅ {checkpoint['ids_done']}/{len(ids)} classified {chunk_counts}")
+
+        # Messages that could not be fetched get another try before the report
+        retry_ids, still_failed = checkpoint['failed_ids'], []
+        if retry_ids:
+            print(f"🔁 Retrying {len(retry_ids)} messages that could not be fetched...")
+        for start in range(0, len(retry_ids), args.chunk_size):
+            chunk_ids = retry_ids[start:start + args.chunk_size]
+            chunk_counts, failed = classify_chunk(service, pool, chunk_ids, args.workers, args.mark_read)
+
+            for label, n in chunk_counts.items():
+                checkpoint['counts'][label] += n
+            still_failed += failed
+            checkpoint['failed_ids'] = still_failed + retry_ids[start + len(chunk_ids):]
+            save_checkpoint(checkpoint)
+
+    print("\n" + "="*40)
+    print("         BACKLOG CLASSIFICATION REPORT")
+    print("="*40)
+    for label, n in checkpoint['counts'].items():
+        print(f"📌 {label.upper()}: {n}")
+    if checkpoint['failed_ids']:
+        print(f"\n⚠️ {len(checkpoint['failed_ids'])} messages still could not be fetched. Run the same command again to retry them.")
+
+    if ce.DRY_RUN:
+        print("\n[!] NOTE: This was a DRY RUN. No labels were actually applied in Gmail.")
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import os.path
+import argparse
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
@@ -7,8 +8,14 @@ from googleapiclient.discovery import build
 SCOPES = ['https://www.googleapis.com/auth/gmail.modify']
 
 def main():
+    parser = argparse.ArgumentParser(description="Authorize Gmail access and list the mailbox's labels.")
+    parser.add_argument('--user', help="Store the token in auth/users/<user>.json for scripts/multi_classify.py")
+    args = parser.parse_args()
+
     creds = None
     token_path = os.path.join('auth', 'token.json')
+    if args.user:
+        token_path = os.path.join('auth', 'users', f'{args.user}.json')
     cred_path = os.path.join('auth', 'credentials.json')
 
     # token.json stores the user's access and refresh tokens
@@ -26,8 +33,8 @@ def main():
             creds = flow.run_local_server(port=0)
         
         # Ensure auth directory exists
-        if not os.path.exists('auth'):
-            os.makedirs('auth')
+        if not os.path.exists(os.path.dirname(token_path)):
+            os.makedirs(os.path.dirname(token_path))
             
         with open(token_path, 'w') as token:
             token.write(creds.to_json())
@@ -2,18 +2,44 @@ import os
 import torch
 import base64
 import re
+import multiprocessing
+import gc
+import time
+import pandas as pd
+from functools import partial
 from googleapiclient.discovery import build
 from google.oauth2.credentials import Credentials
 from transformers import DistilBertForSequenceClassification, DistilBertTokenizer
 from bs4 import BeautifulSoup
+import model_registry
+import active_learning
+from memory_usage import peak_rss_mb
 
 # --- Configuration ---
-MODEL_PATH = os.path.join('models', 'email_classifier_model')
+# Point GMAIL_CLASSIFIER_MODEL at another model dir (e.g. the distilled student) to swap it in,
+# otherwise the registry's active version (see scripts/model_registry.py) is used
+MODEL_OVERRIDE = os.environ.get('GMAIL_CLASSIFIER_MODEL')
+MODEL_PATH = MODEL_OVERRIDE or model_registry.resolve_model_path()
 REMOTE_MODEL_ID = "Rashmi000/Gmail_Label" # <-- Live model on Hugging Face
 SCOPES = ['https://www.googleapis.com/auth/gmail.modify']
 CONFIDENCE_THRESHOLD = 0.85
 LABEL_MAP = {0: "Application_Confirmation", 1: "Rejected"}
+CLASSIFIER_LABELS = list(LABEL_MAP.values()) + ["Uncertain"]
 DRY_RUN = False  # Set to False to actually apply labels and mark as read
+BATCH_SIZE = 16  # Emails per forward pass in batched inference
+# Thread mode: classify each conversation once from its 'newest' message or a 'concat'enation
+# of its unread messages (newest first, truncated to the model's max length). Empty = per message.
+THREAD_STRATEGY = os.environ.get('GMAIL_CLASSIFIER_THREADS', '')
+if THREAD_STRATEGY not in ('', 'newest', 'concat'):
+    # Checked before the model loads, so a typo doesn't silently fall back to another mode
+    raise ValueError(f"GMAIL_CLASSIFIER_THREADS must be 'newest', 'concat' or unset, not {THREAD_STRATEGY!r}")
+# Low-memory mode: bf16 weights, batch size capped so weights plus one batch of activations fit
+# MEMORY_BUDGET_MB (the Python/torch runtime itself is not part of the budget)
+LOW_MEMORY = os.environ.get('GMAIL_CLASSIFIER_LOW_MEMORY') == '1'
+MEMORY_BUDGET_MB = int(os.environ.get('GMAIL_CLASSIFIER_MEMORY_BUDGET_MB', 512))
+# Every run leaves one <run_id>.parquet here: id, date, label, confidence, latency per message
+RUNS_DIR = os.path.join('data', 'runs')
+RUN_COLUMNS = ['id', 'date', 'label', 'confidence', 'latency_ms']
 
 # Search query: finds unread emails from the last 7 days
 # This is more efficient than scanning all time, but flexible enough for daily runs.
@@ -25,60 +51,48 @@ GMAIL_QUERY = f'is:unread after:{seven_days_ago}'
 try:
     print("Loading model...")
     # 1. Check if local model exists, else try remote
-    if os.path.exists(MODEL_PATH):
+    load_source = REMOTE_MODEL_ID
+    if not MODEL_OVERRIDE and (not MODEL_PATH or model_registry.tracks_hub()):
+        # Hub models are cached in the registry; an unchanged revision is not downloaded again
+        try:
+            load_source = model_registry.fetch_from_hub(REMOTE_MODEL_ID)
+            model_registry.activate(os.path.basename(load_source))
+        except Exception as e:
+            print(f"⚠️ Could not check the Hub model ({e}).")
+            load_source = MODEL_PATH or REMOTE_MODEL_ID
+    elif os.path.exists(MODEL_PATH):
         load_source = MODEL_PATH
-        print(f"✅ Using local model: {MODEL_PATH}")
-    else:
-        load_source = REMOTE_MODEL_ID
+    if load_source == REMOTE_MODEL_ID:
         print(f"🚀 Local model not found. Downloading from Hub: {REMOTE_MODEL_ID}")
+    else:
+        print(f"✅ Using local model: {load_source}")
     
-    # Enable attentions for explainability
-    model = DistilBertForSequenceClassification.from_pretrained(load_source, output_attentions=True)
+    if LOW_MEMORY:
+        # Half the bytes of fp32
+        model = DistilBertForSequenceClassification.from_pretrained(load_source, torch_dtype=torch.bfloat16)
+    else:
+        model = DistilBertForSequenceClassification.from_pretrained(load_source)
     tokenizer = DistilBertTokenizer.from_pretrained(load_source)
+    # Distilled students are trained on shorter inputs and save their own max length
+    MAX_LENGTH = min(tokenizer.model_max_length, 512)
     device = "cuda" if torch.cuda.is_available() else "cpu"
     model.to(device)
     model.eval()
-    print(f"✨ Model loaded successfully on {device}")
+    print(f"✨ Model loaded successfully on {device}{' (low-memory bf16)' if LOW_MEMORY else ''}")
 except Exception as e:
     print(f"❌ Error loading model: {e}")
     if load_source == REMOTE_MODEL_ID:
         print("\n💡 TIP: If you are a new user, make sure the REMOTE_MODEL_ID is set correctly in this script.")
     exit(1)
 
-def get_gmail_service():
-    token_path = os.path.join('auth', 'token.json')
+def get_gmail_service(token_path=None):
+    token_path = token_path or os.path.join('auth', 'token.json')
     if not os.path.exists(token_path):
         print(f"Error: {token_path} not found. Run scripts/check_labels.py first.")
         return None
     creds = Credentials.from_authorized_user_file(token_path, SCOPES)
     return build('gmail', 'v1', credentials=creds)
 
-def get_key_phrases(text, top_n=3):
-    """Identifies words that the model paid most attention to."""
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, max_length=512).to(device)
-    with torch.no_grad():
-        outputs = model(**inputs)
-        # Average attention across all heads in the LAST layer
-        # Output attentions size: (batch, num_heads, seq_len, seq_len)
-        attentions = outputs.attentions[-1][0] 
-        avg_attention = attentions.mean(dim=0) # Average over heads
-        
-        # We look at the attention from the [CLS] token (index 0) to all other tokens
-        cls_attention = avg_attention[0]
-        
-    # Map tokens back to words and scores
-    tokens = tokenizer.convert_ids_to_tokens(inputs['input_ids'][0])
-    word_importance = []
-    
-    for i, token in enumerate(tokens):
-        # Ignore special tokens
-        if token in ['[CLS]', '[SEP]', '[PAD]']: continue
-        word_importance.append((token, cls_attention[i].item()))
-        
-    # Sort by importance
-    word_importance.sort(key=lambda x: x[1], reverse=True)
-    return [w[0] for w in word_importance[:top_n]]
-
 def clean_email_text(text):
     if not text: return ""
     if BeautifulSoup and ("<html" in text.lower() or "<div" in text.lower()):
@@ -87,24 +101,100 @@ def clean_email_text(text):
     text = re.sub(r'\s+', ' ', text).strip()
     return text
 
-def predict(text):
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, max_length=512).to(device)
-    with torch.no_grad():
-        logits = model(**inputs).logits
-    probs = torch.softmax(logits, dim=1)
-    confidence, predicted_class = torch.max(probs, dim=1)
-    
-    # Identify key phrases for explanation
-    key_phrases = get_key_phrases(text)
-    
-    return predicted_class.item(), confidence.item(), key_phrases
+def inference_batch_size(with_details=False):
+    """
+    BATCH_SIZE, or fewer in low-memory mode so weights plus one batch of activations fit
+    MEMORY_BUDGET_MB. Per email we count the widest live tensors of one layer (FFN
+    output and attention scores) at full MAX_LENGTH, plus every layer's hidden states
+    when they are returned for the active-learning embeddings.
+    """
+    if not LOW_MEMORY:
+        return BATCH_SIZE
+    config = model.config
+    elem = next(model.parameters()).element_size()
+    weights = sum(p.numel() * p.element_size() for p in model.parameters())
+    per_email = MAX_LENGTH * (config.hidden_dim + config.dim * 2 + config.n_heads * MAX_LENGTH) * elem
+    if with_details:
+        per_email += MAX_LENGTH * config.dim * (config.n_layers + 1) * elem
+    available = MEMORY_BUDGET_MB * 1024 ** 2 - weights
+    return max(1, min(BATCH_SIZE, int(available // per_email)))
+
+def predict_batch(texts, with_details=False, latencies=None):
+    """
+    Classifies texts in padded batches. Returns a (pred_idx, confidence) pair per text,
+    or (pred_idx, confidence, probs, embedding) with with_details=True, where embedding
+    is the final [CLS] hidden state used by the active-learning queue. If a `latencies`
+    list is given, each text's share of its batch time (ms) is appended to it.
+    """
+    results = []
+    batch_size = inference_batch_size(with_details)
+    for i in range(0, len(texts), batch_size):
+        chunk = texts[i:i + batch_size]
+        started = time.perf_counter()
+        inputs = tokenizer(chunk, return_tensors="pt", padding=True, truncation=True, max_length=MAX_LENGTH).to(device)
+        with torch.no_grad():
+            outputs = model(**inputs, output_hidden_states=with_details)
+        probs = torch.softmax(outputs.logits.float(), dim=1)
+        confidence, predicted_class = torch.max(probs, dim=1)
+        if with_details:
+            embeddings = outputs.hidden_states[-1][:, 0].float().cpu()
+            results.extend(zip(predicted_class.tolist(), confidence.tolist(), probs.tolist(), embeddings.numpy()))
+        else:
+            results.extend(zip(predicted_class.tolist(), confidence.tolist()))
+        if latencies is not None:
+            latencies.extend([(time.perf_counter() - started) * 1000 / len(chunk)] * len(chunk))
+        if LOW_MEMORY:
+            # Release this batch's token ids and hidden states before the next one
+            del inputs, outputs
+            gc.collect()
+    return results
+
+def _init_predict_worker():
+    # Each forked worker gets one core; parallelism comes from the pool itself
+    torch.set_num_threads(1)
+
+def _predict_chunk(texts, with_details):
+    latencies = []
+    return predict_batch(texts, with_details, latencies), latencies
 
-def get_unread_emails(service):
+def predict_parallel(texts, workers=None, with_details=False, latencies=None):
+    """
+    Shards texts across a forked process pool. Workers inherit the already-loaded
+    weights copy-on-write, so memory stays at roughly one model copy. Latencies are
+    each worker's own batch times, like predict_batch's.
+    """
+    workers = workers or os.cpu_count() or 1
+    can_fork = "fork" in multiprocessing.get_all_start_methods()
+    if device != "cpu" or not can_fork or workers <= 1 or len(texts) <= BATCH_SIZE:
+        return predict_batch(texts, with_details, latencies)
+
+    chunks = [texts[i:i + BATCH_SIZE] for i in range(0, len(texts), BATCH_SIZE)]
+    ctx = multiprocessing.get_context("fork")
+    with ctx.Pool(min(workers, len(chunks)), initializer=_init_predict_worker) as pool:
+        chunk_results = pool.map(partial(_predict_chunk, with_details=with_details), chunks)
+    if latencies is not None:
+        latencies.extend(l for _, chunk_latencies in chunk_results for l in chunk_latencies)
+    return [r for chunk, _ in chunk_results for r in chunk]
+
+def get_subject_and_text(msg):
+    """Extracts the subject and the cleaned subject + snippet text the model classifies."""
+    headers = msg['payload'].get('headers', [])
+    subject = next((h['value'] for h in headers if h['name'].lower() == 'subject'), "No Subject")
+    snippet = msg.get('snippet', '')
+    return subject, clean_email_text(subject + " " + snippet)
+
+def get_unread_emails(service, query=GMAIL_QUERY):
     # Fetch unread emails using the configured query
-    results = service.users().messages().list(userId='me', q=GMAIL_QUERY).execute()
+    results = service.users().messages().list(userId='me', q=query).execute()
     return results.get('messages', [])
 
 def apply_label(service, msg_id, label_name):
+    apply_label_batch(service, [msg_id], label_name)
+
+def apply_label_batch(service, msg_ids, label_name, mark_read=True):
+    """Labels many messages with one label lookup and as few batchModify calls as possible."""
+    if not msg_ids: return
+
     # 1. Get label ID
     results = service.users().labels().list(userId='me').execute()
     labels = results.get('labels', [])
@@ -117,25 +207,24 @@ def apply_label(service, msg_id, label_name):
         created_label = service.users().labels().create(userId='me', body=label_body).execute()
         label_id = created_label['id']
 
-    # 2. Add label and remove UNREAD
-    service.users().messages().batchModify(
-        userId='me',
-        body={
-            'ids': [msg_id],
-            'addLabelIds': [label_id],
-            'removeLabelIds': ['UNREAD']
-        }
-    ).execute()
+    # 2. Add label and remove UNREAD (batchModify accepts up to 1000 ids per call)
+    for i in range(0, len(msg_ids), 1000):
+        service.users().messages().batchModify(
+            userId='me',
+            body={
+                'ids': msg_ids[i:i + 1000],
+                'addLabelIds': [label_id],
+                'removeLabelIds': ['UNREAD'] if mark_read else []
+            }
+        ).execute()
 
 def ensure_labels_exist(service):
     """Checks for required labels and creates them if missing."""
     print("📋 Checking Gmail labels...")
-    required_labels = ["Application_Confirmation", "Rejected", "Uncertain"]
-    
     results = service.users().labels().list(userId='me').execute()
     existing_labels = [l['name'] for l in results.get('labels', [])]
     
-    for label_name in required_labels:
+    for label_name in CLASSIFIER_LABELS:
         if label_name not in existing_labels:
             print(f"➕ Creating label: {label_name}")
             label_body = {
@@ -145,6 +234,201 @@ def ensure_labels_exist(service):
             }
             service.users().labels().create(userId='me', body=label_body).execute()
 
+def fetch_candidates(service, msg_ids):
+    """Fetches messages and returns (id, subject, text, internal_ts) tuples ready to classify."""
+    candidates = []
+    for msg_id in msg_ids:
+        try:
+            msg = service.users().messages().get(userId='me', id=msg_id).execute()
+            subject, full_text = get_subject_and_text(msg)
+            candidates.append((msg_id, subject, full_text, int(msg.get('internalDate', 0))))
+        except Exception as e:
+            print(f"Error fetching message {msg_id}: {e}")
+    return candidates
+
+def label_predictions(pred_idx, confidence):
+    """Vectorized decision: the predicted label, or 'Uncertain' below CONFIDENCE_THRESHOLD."""
+    return pred_idx.map(LABEL_MAP).where(confidence >= CONFIDENCE_THRESHOLD, "Uncertain")
+
+def save_run(results, runs_dir=RUNS_DIR):
+    """
+    Writes a run's per-message records to data/runs/<run_id>.parquet for extract_metrics.
+    Only RUN_COLUMNS are kept: no subjects or email text ever leave the run. Dry runs
+    are not saved.
+    """
+    if results.empty:
+        return None
+    if DRY_RUN:
+        # Nothing was applied in Gmail, so these predictions must not count as labels
+        return None
+    if not os.path.exists(runs_dir):
+        os.makedirs(runs_dir)
+    run_id = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+    path = os.path.join(runs_dir, f'{run_id}.parquet')
+    records = results[RUN_COLUMNS].astype({'label': 'category', 'confidence': 'float32', 'latency_ms': 'float32'})
+    # Written under a temporary name so extract_metrics never reads half a file
+    records.to_parquet(path + '.tmp', index=False)
+    os.replace(path + '.tmp', path)
+    return path
+
+def record_run(results, records, runs_dir=RUNS_DIR, al_dir=active_learning.AL_DIR):
+    """
+    Queues a run's predictions for active learning and saves its records for
+    extract_metrics. Every classification mode ends here. Dry runs do neither: queued
+    labels are read back as what was applied in Gmail.
+    """
+    if DRY_RUN:
+        return None
+    active_learning.record_predictions(records, al_dir)
+    return save_run(results, runs_dir)
+
+def build_results(candidates, predictions, latencies):
+    """One row per (id, subject, text, internal_ts) candidate with its date, prediction, label and latency_ms."""
+    results = pd.DataFrame({
+        'id': [c[0] for c in candidates],
+        'subject': [c[1] for c in candidates],
+        'date': pd.to_datetime([c[3] for c in candidates], unit='ms', utc=True),
+        'pred': [p[0] for p in predictions],
+        'confidence': [p[1] for p in predictions],
+        'latency_ms': latencies
+    })
+    results['label'] = label_predictions(results['pred'], results['confidence'])
+    return results
+
+def queue_records(candidates, predictions, labels):
+    """Active-learning queue entries for candidates predicted with_details=True."""
+    return [
+        {'id': msg_id, 'subject': subject, 'internal_ts': internal_ts,
+         'label': label, 'probs': probs, 'embedding': embedding}
+        for (msg_id, subject, _, internal_ts), (_, _, probs, embedding), label
+        in zip(candidates, predictions, labels)
+    ]
+
+def classify_candidates(service, candidates):
+    """
+    Classifies candidates in batches, applies one grouped batchModify per label, then
+    queues them for active learning and saves the run (see record_run). Returns one row
+    per message with id, subject, date, label, confidence and latency_ms.
+    """
+    latencies = []
+    predictions = predict_batch([c[2] for c in candidates], with_details=True, latencies=latencies)
+    results = build_results(candidates, predictions, latencies)
+
+    for row in results.itertuples():
+        if row.label == "Uncertain":
+            print(f"[UNCERTAIN] '{row.subject}' (Conf: {row.confidence:.2f}) - Applying 'Uncertain' label.")
+        else:
+            print(f"[{row.label}] '{row.subject}' (Conf: {row.confidence:.2f})")
+
+    if not DRY_RUN:
+        for label, ids in results.groupby('label')['id']:
+            try:
+                apply_label_batch(service, ids.tolist(), label)
+            except Exception as e:
+                print(f"Error applying '{label}' to {len(ids)} messages: {e}")
+
+    record_run(results, queue_records(candidates, predictions, results['label']))
+    return results
+
+def classify_threads(service, messages):
+    """
+    Classifies each thread once and labels it with one grouped batchModify per label.
+    The whole thread gets the label, unless an earlier message already carries a
+    different classifier label (e.g. a confirmation followed by a rejection): then only
+    the new messages are labelled, so the thread keeps both. Returns one row per new
+    message, like classify_candidates.
+    """
+    threads = {}
+    for m in messages:
+        threads.setdefault(m['threadId'], set()).add(m['id'])
+
+    labels = service.users().labels().list(userId='me').execute().get('labels', [])
+    classifier_labels = {l['id']: l['name'] for l in labels if l['name'] in CLASSIFIER_LABELS}
+
+    # 1. One metadata-only request per thread returns every message's subject and snippet
+    candidates = []
+    for thread_id, unread_ids in threads.items():
+        try:
+            thread = service.users().threads().get(
+                userId='me', id=thread_id, format='metadata', metadataHeaders=['Subject']
+            ).execute()
+            thread_msgs = sorted(thread['messages'], key=lambda t: int(t.get('internalDate', 0)), reverse=True)
+            new_msgs = [t for t in thread_msgs if t['id'] in unread_ids]
+            texts = [get_subject_and_text(t) for t in new_msgs]
+            subject = texts[0][0]
+            text = texts[0][1] if THREAD_STRATEGY != 'concat' else " ".join(t[1] for t in texts)
+            existing = {classifier_labels[l] for t in thread_msgs if t['id'] not in unread_ids
+                        for l in t.get('labelIds', []) if l in classifier_labels}
+            candidates.append({'thread_id': thread_id, 'subject': subject, 'text': text,
+                               'newest': new_msgs[0], 'unread_ids': [t['id'] for t in new_msgs],
+                               'unread_ts': [int(t.get('internalDate', 0)) for t in new_msgs],
+                               'all_ids': [t['id'] for t in thread_msgs], 'existing': existing})
+        except Exception as e:
+            print(f"Error fetching thread {thread_id}: {e}")
+
+    # 2. One forward pass per thread, batched
+    latencies = []
+    predictions = predict_batch([c['text'] for c in candidates], with_details=True, latencies=latencies)
+    results = pd.DataFrame({
+        'id': [c['unread_ids'] for c in candidates],
+        'subject': [c['subject'] for c in candidates],
+        'date': [c['unread_ts'] for c in candidates],
+        'pred': [p[0] for p in predictions],
+        'confidence': [p[1] for p in predictions],
+        'latency_ms': latencies
+    })
+    results['label'] = label_predictions(results['pred'], results['confidence'])
+
+    by_label, thread_records = {}, []
+    for c, (_, conf, probs, embedding), label in zip(candidates, predictions, results['label']):
+        disagrees = bool(c['existing'] - {label})
+        ids = c['unread_ids'] if disagrees else c['all_ids']
+        scope = f"{len(ids)} new messages, earlier ones keep {', '.join(sorted(c['existing']))}" if disagrees else f"thread of {len(ids)}"
+        print(f"[{label}] '{c['subject']}' (Conf: {conf:.2f}, {scope})")
+        by_label.setdefault(label, []).extend(ids)
+        thread_records.append({'id': c['newest']['id'], 'subject': c['subject'],
+                               'internal_ts': int(c['newest'].get('internalDate', 0)),
+                               'label': label, 'probs': probs, 'embedding': embedding})
+
+    # 3. Grouped labelling: one batchModify per label for all threads
+    if not DRY_RUN:
+        for label, ids in by_label.items():
+            try:
+                apply_label_batch(service, ids, label)
+            except Exception as e:
+                print(f"Error applying '{label}' to {len(ids)} messages: {e}")
+
+    # 4. One record per new message; the thread's forward pass is shared between them
+    results['latency_ms'] /= results['id'].map(len)
+    results = results.explode(['id', 'date'], ignore_index=True)
+    results['date'] = pd.to_datetime(results['date'].astype('int64'), unit='ms', utc=True)
+    record_run(results, thread_records)
+    return results
+
+def print_report(results):
+    """Counts per label plus the first 10 subjects of each, from the run's records."""
+    print("\n" + "="*40)
+    print("         FINAL CLASSIFICATION REPORT")
+    print("="*40)
+
+    counts = results['label'].value_counts()
+    # Thread mode has one row per message; list each conversation's subject once
+    samples = results.drop_duplicates(['label', 'subject']).groupby('label')['subject']
+    for category in CLASSIFIER_LABELS:
+        print(f"\n📌 {category.upper()} ({counts.get(category, 0)})")
+        if category not in counts:
+            print("  (None)")
+            continue
+        subjects = samples.get_group(category)
+        for s in subjects.head(10): # Show first 10
+            print(f"  - {s}")
+        if len(subjects) > 10:
+            print(f"  ... and {len(subjects)-10} more")
+
+    inference_s = results['latency_ms'].sum() / 1000
+    if inference_s > 0:
+        print(f"\n⚡ Inference: {len(results)} emails in {inference_s:.2f}s ({len(results) / inference_s:.1f} emails/s)")
+
 def main():
     service = get_gmail_service()
     if not service: return
@@ -159,56 +443,21 @@ def main():
 
     print(f"Found {len(messages)} unread emails. Processing...")
     
-    report = {
-        "Application_Confirmation": [],
-        "Rejected": [],
-        "Uncertain": []
-    }
-
-    for m in messages:
-        try:
-            msg = service.users().messages().get(userId='me', id=m['id']).execute()
-            
-            # Extract Subject and Body
-            headers = msg['payload'].get('headers', [])
-            subject = next((h['value'] for h in headers if h['name'].lower() == 'subject'), "No Subject")
-            
-            # Extract content
-            snippet = msg.get('snippet', '')
-            full_text = clean_email_text(subject + " " + snippet)
-
-            # Predict
-            pred_idx, conf, key_phrases = predict(full_text)
-            
-            if conf >= CONFIDENCE_THRESHOLD:
-                label = LABEL_MAP[pred_idx]
-                print(f"[{label}] '{subject}' (Conf: {conf:.2f})")
-                if not DRY_RUN:
-                    apply_label(service, m['id'], label)
-                report[label].append(subject)
-            else:
-                print(f"[UNCERTAIN] '{subject}' (Conf: {conf:.2f}) - Applying 'Uncertain' label.")
-                if not DRY_RUN:
-                    apply_label(service, m['id'], "Uncertain")
-                report["Uncertain"].append(subject)
-
-        except Exception as e:
-            print(f"Error processing message {m['id']}: {e}")
+    if THREAD_STRATEGY:
+        print(f"🧵 Thread mode ({THREAD_STRATEGY}): {len({m['threadId'] for m in messages})} conversations.")
+        results = classify_threads(service, messages)
+    else:
+        candidates = fetch_candidates(service, [m['id'] for m in messages])
+        results = classify_candidates(service, candidates)
 
-    print("\n" + "="*40)
-    print("         FINAL CLASSIFICATION REPORT")
-    print("="*40)
-    
-    for category, subjects in report.items():
-        print(f"\n📌 {category.upper()} ({len(subjects)})")
-        if subjects:
-            for s in subjects[:10]: # Show first 10
-                print(f"  - {s}")
-            if len(subjects) > 10:
-                print(f"  ... and {len(subjects)-10} more")
-        else:
-            print("  (None)")
+    print_report(results)
     
+    peak = peak_rss_mb()
+    if peak is not None:
+        budget = (f" (weights+activations budget {MEMORY_BUDGET_MB} MB on top of the Python/torch baseline, "
+                  f"batch size {inference_batch_size(True)})") if LOW_MEMORY else ""
+        print(f"\n🧮 Peak memory (RSS): {peak:.0f} MB{budget}")
+
     if DRY_RUN:
         print("\n[!] NOTE: This was a DRY RUN. No labels were actually applied in Gmail.")
 
@@ -3,10 +3,13 @@ import csv
 import base64
 import re
 import json
+import argparse
 from datetime import datetime
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 import pandas as pd
+import active_learning
+import training_index
 
 try:
     from bs4 import BeautifulSoup
@@ -20,6 +23,8 @@ DATA_DIR = 'data'
 RAW_FILE = os.path.join(DATA_DIR, 'raw_emails.csv')
 TRAINING_FILE = os.path.join(DATA_DIR, 'training_data.csv')
 STATE_FILE = os.path.join('state', 'sync_state.json')
+PROGRESS_FILE = os.path.join('state', 'sync_progress.json')  # Only exists while a sync is unfinished
+SYNC_CHUNK_SIZE = 100  # Emails per Gmail page, flushed to disk as one chunk
 
 def final_clean(text):
     """Deep cleaning of email text for training."""
@@ -93,28 +98,117 @@ def get_full_text(msg):
         content = msg.get('snippet', '')
     return clean_email_text(content)
 
-def get_data():
-    if not os.path.exists(os.path.join('auth', 'token.json')):
-        print("Please run scripts/check_labels.py first!")
-        return
+def email_row(msg, label_name):
+    """Builds the raw_emails.csv row for a labelled Gmail message."""
+    headers = msg['payload'].get('headers', [])
+    subject = next((h['value'] for h in headers if h['name'].lower() == 'subject'), "No Subject")
+    sender = next((h['value'] for h in headers if h['name'].lower() == 'from'), "Unknown")
+    date_val = next((h['value'] for h in headers if h['name'].lower() == 'date'), "Unknown")
+    return {
+        'date': date_val,
+        'sender': sender,
+        'label': label_name,
+        'subject': subject,
+        'text': get_full_text(msg)
+    }
+
+def write_json_atomic(path, data):
+    """Writes JSON via a temp file + rename so readers never see a half-written file."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def file_size(path):
+    return os.path.getsize(path) if os.path.exists(path) else 0
 
-    if not os.path.exists(DATA_DIR):
-        os.makedirs(DATA_DIR)
+def rollback_uncommitted(path, committed_size):
+    """Truncates rows appended after the last committed chunk (e.g. by a crashed run)."""
+    if file_size(path) > committed_size:
+        with open(path, 'r+b') as f:
+            f.truncate(committed_size)
+
+def append_csv(df, path):
+    """Appends rows and fsyncs, returning the new committed file size."""
+    with open(path, 'a', newline='', encoding='utf-8') as f:
+        df.to_csv(f, index=False, header=file_size(path) == 0)
+        f.flush()
+        os.fsync(f.fileno())
+    return file_size(path)
+
+def flush_chunk(emails, progress):
+    """Writes one chunk of emails to the raw and training CSVs."""
+    # 1. Save RAW DATA
+    df_raw = pd.DataFrame(emails, columns=['date', 'sender', 'label', 'subject', 'text'])
+    progress['raw_size'] = append_csv(df_raw, RAW_FILE)
+
+    # 2. Save TRAINING DATA (Processed)
+    df_train = df_raw.copy()
+    df_train['full_text'] = df_train['subject'].fillna('') + " " + df_train['text'].fillna('')
+    df_train['full_text'] = df_train['full_text'].apply(final_clean)
+    df_train = df_train[df_train['full_text'].str.len() > 30]
+    df_train = df_train[['label', 'full_text']]
+    if not df_train.empty:
+        progress['train_size'] = append_csv(df_train, TRAINING_FILE)
+        # Index only the rows just appended so training can seek straight to them
+        training_index.update_index(TRAINING_FILE)
+
+def load_progress(target_labels):
+    """
+    Resumes an interrupted sync from its last committed chunk, or starts a new one.
+    The CSVs are rolled back to the sizes recorded with that chunk.
+    """
+    if os.path.exists(PROGRESS_FILE):
+        with open(PROGRESS_FILE, 'r') as f:
+            progress = json.load(f)
+        rollback_uncommitted(RAW_FILE, progress['raw_size'])
+        rollback_uncommitted(TRAINING_FILE, progress['train_size'])
+        training_index.update_index(TRAINING_FILE)
+        print(f"♻️ Resuming interrupted sync ({progress['collected']} emails already committed).")
+        return progress
 
     # Load last sync timestamp
-    last_sync_ts = 0  
+    last_sync_ts = 0
     if os.path.exists(STATE_FILE):
         with open(STATE_FILE, 'r') as f:
             last_sync_ts = json.load(f).get('last_sync_ts', 0)
-    
-    new_sync_ts = int(datetime.now().timestamp() * 1000)
-    creds = Credentials.from_authorized_user_file(os.path.join('auth', 'token.json'), SCOPES)
-    service = build('gmail', 'v1', credentials=creds)
+
+    progress = {
+        'last_sync_ts': last_sync_ts,
+        'new_sync_ts': int(datetime.now().timestamp() * 1000),
+        'labels': {name: {'page_token': None, 'done': False} for name in target_labels},
+        'raw_size': file_size(RAW_FILE),
+        'train_size': file_size(TRAINING_FILE),
+        'collected': 0
+    }
+    # Committed before the first page, so a crash inside it still rolls back to these sizes
+    write_json_atomic(PROGRESS_FILE, progress)
+    return progress
+
+def get_data():
+    if not os.path.exists(os.path.join('auth', 'token.json')):
+        print("Please run scripts/check_labels.py first!")
+        return
+
+    for d in (DATA_DIR, os.path.dirname(STATE_FILE)):
+        if not os.path.exists(d):
+            os.makedirs(d)
 
     target_labels = ['Application_Confirmation', 'Rejected']
-    all_emails = []
+    progress = load_progress(target_labels)
+    last_sync_ts = progress['last_sync_ts']
+    # Corrections collected by --corrections are already training rows
+    collected_ids = active_learning.load_collected()
+
+    creds = Credentials.from_authorized_user_file(os.path.join('auth', 'token.json'), SCOPES)
+    service = build('gmail', 'v1', credentials=creds)
 
     for label_name in target_labels:
+        label_progress = progress['labels'][label_name]
+        if label_progress['done']:
+            continue
         try:
             if last_sync_ts == 0:
                 print(f"Syncing ALL historical emails for: {label_name}...")
@@ -124,12 +218,17 @@ def get_data():
                 print(f"Syncing: {label_name} since {query_date}...")
                 query = f'label:"{label_name}" after:{query_date}'
 
-            page_token = None
-            while True:
-                results = service.users().messages().list(userId='me', q=query, pageToken=page_token).execute()
+            # Each page is one chunk: fetched, flushed to disk, then marked committed
+            while not label_progress['done']:
+                results = service.users().messages().list(
+                    userId='me', q=query, pageToken=label_progress['page_token'], maxResults=SYNC_CHUNK_SIZE
+                ).execute()
                 messages = results.get('messages', [])
+                chunk = []
 
                 for m in messages:
+                    if m['id'] in collected_ids:
+                        continue
                     try:
                         msg = service.users().messages().get(userId='me', id=m['id']).execute()
                         msg_ts = int(msg.get('internalDate', 0))
@@ -137,50 +236,83 @@ def get_data():
                         if msg_ts <= last_sync_ts:
                             continue
 
-                        headers = msg['payload'].get('headers', [])
-                        subject = next((h['value'] for h in headers if h['name'].lower() == 'subject'), "No Subject")
-                        sender = next((h['value'] for h in headers if h['name'].lower() == 'from'), "Unknown")
-                        date_val = next((h['value'] for h in headers if h['name'].lower() == 'date'), "Unknown")
-                        
-                        content = get_full_text(msg)
-                        all_emails.append({
-                            'date': date_val,
-                            'sender': sender,
-                            'label': label_name,
-                            'subject': subject,
-                            'text': content
-                        })
+                        chunk.append(email_row(msg, label_name))
                     except Exception as e:
                         print(f"Error on message {m['id']}: {e}")
-                
-                page_token = results.get('nextPageToken')
-                if not page_token:
-                    break
+
+                if chunk:
+                    flush_chunk(chunk, progress)
+                    progress['collected'] += len(chunk)
+
+                label_progress['page_token'] = results.get('nextPageToken')
+                label_progress['done'] = label_progress['page_token'] is None
+                write_json_atomic(PROGRESS_FILE, progress)
+                if chunk:
+                    print(f"💾 Committed {len(chunk)} {label_name} emails ({progress['collected']} total).")
         except Exception as e:
             print(f"Error fetching label {label_name}: {e}")
 
-    if all_emails:
-        # 1. Save RAW DATA
-        df_raw = pd.DataFrame(all_emails)
-        raw_exists = os.path.exists(RAW_FILE)
-        df_raw.to_csv(RAW_FILE, mode='a', index=False, header=not raw_exists)
-        
-        # 2. Save TRAINING DATA (Processed)
-        df_train = df_raw.copy()
-        df_train['full_text'] = df_train['subject'].fillna('') + " " + df_train['text'].fillna('')
-        df_train['full_text'] = df_train['full_text'].apply(final_clean)
-        df_train = df_train[df_train['full_text'].str.len() > 30]
-        df_train = df_train[['label', 'full_text']]
-        
-        train_exists = os.path.exists(TRAINING_FILE)
-        df_train.to_csv(TRAINING_FILE, mode='a', index=False, header=not train_exists)
-        
-        with open(STATE_FILE, 'w') as f:
-            json.dump({'last_sync_ts': new_sync_ts}, f)
-            
-        print(f"Success! Collected and processed {len(all_emails)} emails.")
+    if not all(p['done'] for p in progress['labels'].values()):
+        print(f"⚠️ Sync incomplete. Progress saved to {PROGRESS_FILE}; re-run to resume.")
+        return
+
+    write_json_atomic(STATE_FILE, {'last_sync_ts': progress['new_sync_ts']})
+    os.remove(PROGRESS_FILE)
+
+    if progress['collected']:
+        print(f"Success! Collected and processed {progress['collected']} emails.")
     else:
         print("No new emails found.")
 
+def collect_corrections(user=None):
+    """
+    Collects only the emails requested by scripts/active_learning.py, once they have been
+    hand-labelled in Gmail. Their dates are usually older than the last sync, so a
+    regular sync would never pick them up. Only a human decision counts: a label other
+    than the one the classifier applied, or any label on an 'Uncertain' email. The
+    classifier's own label may be left on. With a user, a multi_classify mailbox's
+    requests are collected from that mailbox.
+    """
+    if os.path.exists(PROGRESS_FILE):
+        print("An interrupted sync is pending. Run scripts/collect_data.py to finish it first.")
+        return
+
+    al_dir = active_learning.user_dir(user) if user else active_learning.AL_DIR
+    token_path = os.path.join('auth', 'users', f'{user}.json') if user else os.path.join('auth', 'token.json')
+    requests = active_learning.load_requests(al_dir)
+    if not requests:
+        print("No labelling requests. Run scripts/active_learning.py first.")
+        return
+
+    creds = Credentials.from_authorized_user_file(token_path, SCOPES)
+    service = build('gmail', 'v1', credentials=creds)
+    labels = service.users().labels().list(userId='me').execute().get('labels', [])
+    target_ids = {l['id']: l['name'] for l in labels if l['name'] in ['Application_Confirmation', 'Rejected']}
+
+    emails, collected_ids = [], []
+    for r in requests:
+        try:
+            msg = service.users().messages().get(userId='me', id=r['id']).execute()
+            names = {target_ids[l] for l in msg.get('labelIds', []) if l in target_ids}
+            new_names = names - {r.get('applied_label', r.get('predicted'))}
+            if len(new_names) != 1:
+                continue  # Not relabelled yet
+            emails.append(email_row(msg, new_names.pop()))
+            collected_ids.append(r['id'])
+        except Exception as e:
+            print(f"Error on message {r['id']}: {e}")
+
+    if emails:
+        flush_chunk(emails, {})
+        active_learning.mark_collected(collected_ids, al_dir)
+    print(f"Collected {len(emails)} of {len(requests)} requested corrections.")
+
 if __name__ == '__main__':
-    get_data()
+    parser = argparse.ArgumentParser(description="Sync labelled emails into the training data.")
+    parser.add_argument('--corrections', action='store_true', help="Collect hand-labelled active-learning requests instead")
+    parser.add_argument('--user', help="With --corrections: a multi_classify mailbox from auth/users/")
+    args = parser.parse_args()
+    if args.corrections:
+        collect_corrections(args.user)
+    else:
+        get_data()
@@ -0,0 +1,195 @@
+import pandas as pd
+from datasets import Dataset
+from transformers import (DistilBertConfig, DistilBertForSequenceClassification, DistilBertTokenizer,
+                          Trainer, TrainingArguments)
+import torch
+import torch.nn.functional as F
+import argparse
+import time
+import os
+import json
+import model_registry
+
+TEACHER_DIR = model_registry.resolve_model_path() or os.path.join('models', 'email_classifier_model')
+STUDENT_DIR = os.path.join('models', 'email_classifier_student')
+DATASET_PATH = os.path.join('data', 'training_data.csv')
+STUDENT_MAX_LENGTH = 256  # Subject + first lines carry the signal; half the teacher's 512
+TEMPERATURE = 2.0
+ALPHA = 0.7  # Weight of the soft-label loss vs. the hard-label loss
+
+class DistillationTrainer(Trainer):
+    """Trainer whose loss mixes KL to the teacher's softened logits with the usual cross-entropy."""
+
+    def compute_loss(self, model, inputs, return_outputs=False, num_items_in_batch=None):
+        teacher_logits = inputs.pop("teacher_logits")
+        labels = inputs.pop("labels")
+        outputs = model(**inputs)
+        soft_loss = F.kl_div(
+            F.log_softmax(outputs.logits / TEMPERATURE, dim=-1),
+            F.softmax(teacher_logits / TEMPERATURE, dim=-1),
+            reduction="batchmean",
+        ) * TEMPERATURE ** 2
+        hard_loss = F.cross_entropy(outputs.logits, labels)
+        loss = ALPHA * soft_loss + (1 - ALPHA) * hard_loss
+        return (loss, outputs) if return_outputs else loss
+
+def student_heads(dim):
+    """Attention heads for a narrower student: one per 64 dims, like the teacher."""
+    return max(1, dim // 64)
+
+def build_student(teacher, n_layers, dim):
+    """
+    Shrinks the teacher's config. At the teacher's width the embeddings and an evenly
+    spaced subset of layers are copied over; a narrower student starts from scratch.
+    """
+    config = DistilBertConfig.from_dict(teacher.config.to_dict())
+    config.n_layers = n_layers
+    if dim and dim != teacher.config.dim:
+        config.dim = dim
+        config.hidden_dim = dim * 4
+        config.n_heads = student_heads(dim)
+        if dim % config.n_heads:
+            raise ValueError(f"--dim {dim} is not divisible by its {config.n_heads} attention heads")
+        return DistilBertForSequenceClassification(config)
+
+    student = DistilBertForSequenceClassification(config)
+    student.distilbert.embeddings.load_state_dict(teacher.distilbert.embeddings.state_dict())
+    teacher_layers = teacher.distilbert.transformer.layer
+    step = (len(teacher_layers) - 1) / max(1, n_layers - 1)
+    for i, layer in enumerate(student.distilbert.transformer.layer):
+        layer.load_state_dict(teacher_layers[round(i * step)].state_dict())
+    student.pre_classifier.load_state_dict(teacher.pre_classifier.state_dict())
+    student.classifier.load_state_dict(teacher.classifier.state_dict())
+    return student
+
+def predict_logits(model, tokenizer, texts, max_length, batch_size=32):
+    model.eval()
+    all_logits = []
+    for i in range(0, len(texts), batch_size):
+        inputs = tokenizer(texts[i:i + batch_size], return_tensors="pt", padding=True,
+                           truncation=True, max_length=max_length).to(model.device)
+        with torch.no_grad():
+            all_logits.append(model(**inputs).logits.float().cpu())
+    return torch.cat(all_logits)
+
+def measure_latency(model, tokenizer, texts, max_length, n=50):
+    """Mean single-email latency in milliseconds (the classifier's per-message case)."""
+    model.eval()
+    texts = texts[:n]
+    start = time.perf_counter()
+    for text in texts:
+        inputs = tokenizer(text, return_tensors="pt", truncation=True, max_length=max_length).to(model.device)
+        with torch.no_grad():
+            model(**inputs)
+    return (time.perf_counter() - start) / max(1, len(texts)) * 1000
+
+def model_size_mb(model):
+    return sum(p.numel() * p.element_size() for p in model.parameters()) / 1024 ** 2
+
+def distill(n_layers=2, dim=None, epochs=3):
+    print("--- 🧪 Starting Distillation ---")
+    if dim and dim % student_heads(dim):
+        print(f"Error: --dim {dim} must be divisible by its {student_heads(dim)} attention heads (e.g. a multiple of 64).")
+        return
+    if not os.path.exists(TEACHER_DIR):
+        print(f"Error: Teacher model not found at {TEACHER_DIR}. Train it first.")
+        return
+    if not os.path.exists(DATASET_PATH):
+        print(f"Error: {DATASET_PATH} not found. Run collect_data.py first.")
+        return
+
+    # 1. Load the corpus and hold out 10% for the report
+    df = pd.read_csv(DATASET_PATH)
+    label_map = {"Application_Confirmation": 0, "Rejected": 1}
+    df['label'] = df['label'].map(label_map)
+    df = df.dropna(subset=['label'])
+    df['label'] = df['label'].astype(int)
+    eval_df = df.sample(frac=0.1, random_state=42)
+    train_df = df.drop(eval_df.index).reset_index(drop=True)
+    eval_df = eval_df.reset_index(drop=True)
+    print(f"Train: {len(train_df)} | Held-out: {len(eval_df)}")
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    tokenizer = DistilBertTokenizer.from_pretrained(TEACHER_DIR)
+    teacher = DistilBertForSequenceClassification.from_pretrained(TEACHER_DIR).to(device)
+
+    # 2. Soft labels: run the teacher once over the corpus instead of every epoch
+    print("Computing teacher soft labels...")
+    train_df['teacher_logits'] = predict_logits(teacher, tokenizer, train_df['full_text'].tolist(), 512).tolist()
+
+    # 3. Build the student
+    student = build_student(teacher, n_layers, dim).to(device)
+    print(f"Student: {n_layers} layers, dim {student.config.dim} "
+          f"({model_size_mb(student):.0f} MB vs teacher {model_size_mb(teacher):.0f} MB)")
+
+    def tokenize_function(examples):
+        return tokenizer(examples["full_text"], padding="max_length", truncation=True, max_length=STUDENT_MAX_LENGTH)
+
+    train_dataset = Dataset.from_pandas(train_df[['full_text', 'label', 'teacher_logits']]).map(tokenize_function, batched=True)
+    train_dataset = train_dataset.rename_column("label", "labels").remove_columns(["full_text"])
+
+    training_args = TrainingArguments(
+        output_dir="./results",
+        learning_rate=5e-5,
+        per_device_train_batch_size=16 if device == "cuda" else 8,
+        num_train_epochs=epochs,
+        weight_decay=0.01,
+        eval_strategy="no",
+        save_strategy="no",
+        report_to="none",
+        remove_unused_columns=False,  # Keep teacher_logits for compute_loss
+    )
+    trainer = DistillationTrainer(
+        model=student,
+        args=training_args,
+        train_dataset=train_dataset,
+        processing_class=tokenizer,
+    )
+
+    print("Training student...")
+    trainer.train()
+
+    # 4. Report accuracy vs. labels and teacher, latency and size
+    eval_texts = eval_df['full_text'].tolist()
+    labels = torch.tensor(eval_df['label'].values)
+    teacher_preds = predict_logits(teacher, tokenizer, eval_texts, 512).argmax(dim=1)
+    student_preds = predict_logits(student, tokenizer, eval_texts, STUDENT_MAX_LENGTH).argmax(dim=1)
+    report = {
+        'student_layers': n_layers,
+        'student_dim': student.config.dim,
+        'student_max_length': STUDENT_MAX_LENGTH,
+        'eval_rows': len(eval_df),
+        'teacher_accuracy': (teacher_preds == labels).float().mean().item(),
+        'student_accuracy': (student_preds == labels).float().mean().item(),
+        'agreement_with_teacher': (student_preds == teacher_preds).float().mean().item(),
+        'teacher_latency_ms': measure_latency(teacher, tokenizer, eval_texts, 512),
+        'student_latency_ms': measure_latency(student, tokenizer, eval_texts, STUDENT_MAX_LENGTH),
+        'teacher_size_mb': model_size_mb(teacher),
+        'student_size_mb': model_size_mb(student),
+    }
+
+    print("\n" + "="*40)
+    print("         DISTILLATION REPORT")
+    print("="*40)
+    print(f"Accuracy   teacher {report['teacher_accuracy']:.3f} | student {report['student_accuracy']:.3f}")
+    print(f"Agreement  {report['agreement_with_teacher']:.3f}")
+    print(f"Latency    teacher {report['teacher_latency_ms']:.1f} ms | student {report['student_latency_ms']:.1f} ms")
+    print(f"Size       teacher {report['teacher_size_mb']:.0f} MB | student {report['student_size_mb']:.0f} MB")
+
+    # 5. Save (the tokenizer carries the student's max length for classify_emails)
+    print(f"\nSaving student to {STUDENT_DIR}...")
+    tokenizer.model_max_length = STUDENT_MAX_LENGTH
+    student.save_pretrained(STUDENT_DIR)
+    tokenizer.save_pretrained(STUDENT_DIR)
+    with open(os.path.join(STUDENT_DIR, 'distill_report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n✅ Distillation complete. Use it with: GMAIL_CLASSIFIER_MODEL={STUDENT_DIR} python scripts/classify_emails.py")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Distill the fine-tuned classifier into a small student.")
+    parser.add_argument('--layers', type=int, default=2, help="Transformer layers in the student")
+    parser.add_argument('--dim', type=int, default=None, help="Narrower hidden size (e.g. 384); trains from scratch")
+    parser.add_argument('--epochs', type=int, default=3)
+    args = parser.parse_args()
+    distill(n_layers=args.layers, dim=args.dim, epochs=args.epochs)
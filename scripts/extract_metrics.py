@@ -1,33 +1,94 @@
 import pandas as pd
 import os
-import json
+import glob
+import argparse
 
-def extract_metrics():
-    raw_file = os.path.join('data', 'raw_emails.csv')
-    metrics_file = os.path.join('data', 'metrics.csv')
-    
-    if not os.path.exists(raw_file):
-        print(f"❌ Error: {raw_file} not found. Run a sync first.")
-        return
+RAW_FILE = os.path.join('data', 'raw_emails.csv')
+RUNS_DIR = os.path.join('data', 'runs')  # Per-message records written by classify_emails
+METRICS_FILE = os.path.join('data', 'metrics.csv')
+RUN_HISTORY_FILE = os.path.join('data', 'run_history.csv')
+USERS_DATA_DIR = os.path.join('data', 'users')  # multi_classify mailboxes: <user>/runs/
+COMPACTED_FILE = 'compacted.parquet'  # Every run folded into one file, inside the runs dir
 
+def load_runs(runs_dir=RUNS_DIR):
+    """
+    Every run's records in one frame, oldest run first, or None if no run was saved yet.
+    Per-run files (live mode writes one per micro-batch) are folded into one compacted
+    file as they are read, so each of them is only read once.
+    """
+    compacted_path = os.path.join(runs_dir, COMPACTED_FILE)
+    paths = sorted(p for p in glob.glob(os.path.join(runs_dir, '*.parquet')) if p != compacted_path)
+    frames = [pd.read_parquet(compacted_path)] if os.path.exists(compacted_path) else []
+    frames += [pd.read_parquet(path).assign(run_id=os.path.splitext(os.path.basename(path))[0]) for path in paths]
+    if not frames:
+        return None
+    runs = pd.concat(frames, ignore_index=True)
+    if paths:
+        # A crash after writing the compacted file but before removing its sources leaves both
+        runs = runs.drop_duplicates(subset=['run_id', 'id']).sort_values('run_id', kind='stable', ignore_index=True)
+        runs.to_parquet(compacted_path + '.tmp', index=False)
+        os.replace(compacted_path + '.tmp', compacted_path)
+        for path in paths:
+            os.remove(path)
+    return runs
+
+def run_history(runs):
+    """One row per run: when it ran, how many emails, inference time and throughput."""
+    history = runs.groupby('run_id').agg(
+        messages=('id', 'size'),
+        inference_s=('latency_ms', 'sum'),
+        mean_confidence=('confidence', 'mean')
+    ).reset_index()
+    history['inference_s'] /= 1000
+    history['emails_per_s'] = history['messages'] / history['inference_s']
+    history = history.round(3)
+    history['run_at'] = pd.to_datetime(history['run_id'], format='%Y%m%dT%H%M%S%f')
+    return history[['run_at', 'messages', 'inference_s', 'emails_per_s', 'mean_confidence']]
+
+def count_by_date(df):
+    """Date, Label and Count only."""
+    df = df.dropna(subset=['date_only'])
+    return df.groupby(['date_only', 'label'], observed=True).size().rename('count')
+
+def extract_metrics(user=None):
+    """
+    Writes metrics.csv and run_history.csv. With a user, they are built from that
+    multi_classify mailbox's run records and written to data/users/<user>/.
+    """
     print("--- 🛡️ Extracting Privacy-Safe Metrics ---")
-    
+    data_dir = os.path.join(USERS_DATA_DIR, user) if user else 'data'
+    runs_dir = os.path.join(data_dir, 'runs') if user else RUNS_DIR
+    metrics_file = os.path.join(data_dir, 'metrics.csv') if user else METRICS_FILE
+    run_history_file = os.path.join(data_dir, 'run_history.csv') if user else RUN_HISTORY_FILE
+
     try:
-        # 1. Load raw data
-        df = pd.read_csv(raw_file)
-        
-        # 2. Convert date to standard YYYY-MM-DD
-        df['date_dt'] = pd.to_datetime(df['date'], errors='coerce', utc=True)
-        df['date_only'] = df['date_dt'].dt.date
-        
-        # 3. Drop rows with invalid dates
-        df = df.dropna(subset=['date_only'])
-        
-        # 4. Group by Date and Label to get counts
-        # We ONLY keep Date, Label, and Count
-        metrics_df = df.groupby(['date_only', 'label']).size().reset_index(name='count')
-        
-        # 5. Save to the safe file
+        sources = []
+
+        # 1. Synced raw emails: the full labelled history (only the main mailbox is synced)
+        if not user and os.path.exists(RAW_FILE):
+            raw = pd.read_csv(RAW_FILE, usecols=['date', 'label'])
+            raw['date_only'] = pd.to_datetime(raw['date'], errors='coerce', utc=True).dt.date
+            sources.append(count_by_date(raw))
+
+        # 2. Classifier run records: a re-classified message counts once, with its latest label
+        runs = load_runs(runs_dir)
+        if runs is not None:
+            latest = runs.drop_duplicates(subset='id', keep='last')
+            sources.append(count_by_date(latest.assign(date_only=latest['date'].dt.date)))
+            history = run_history(runs)
+            history.to_csv(run_history_file, index=False)
+            print(f"⚡ Run history ({len(history)} runs) saved to: {run_history_file}")
+
+        if not sources:
+            print(f"❌ Error: no {RAW_FILE} and no run records in {runs_dir}. Sync or classify first.")
+            return
+
+        # 3. Merge: a message labelled by the classifier shows up in the next sync too, so
+        # where both sources count a date and label the larger count is kept, not the sum
+        metrics_df = pd.concat(sources, axis=1).max(axis=1).astype(int).rename('count').reset_index()
+        metrics_df = metrics_df.sort_values(['date_only', 'label'])
+
+        # 4. Save to the safe file
         metrics_df.to_csv(metrics_file, index=False)
         print(f"✅ Safe metrics saved to: {metrics_file}")
         print(f"💡 This file contains ONLY counts and dates. No private email content.")
@@ -36,4 +97,6 @@ def extract_metrics():
         print(f"❌ Failed to extract metrics: {e}")
 
 if __name__ == "__main__":
-    extract_metrics()
+    parser = argparse.ArgumentParser(description="Turn synced emails and run records into privacy-safe counts.")
+    parser.add_argument('--user', help="A multi_classify mailbox: reads and writes data/users/<user>/")
+    extract_metrics(parser.parse_args().user)
@@ -4,13 +4,22 @@ import time
 import json
 import shutil
 import zipfile
+import model_registry
+import training_index
+import perf_gate
 
 # --- CONFIG ---
 KAGGLE_USERNAME = "YOUR_KAGGLE_USERNAME" # <--- UPDATE THIS
 KERNEL_SLUG = "gmail-classifier-training"
 DATASET_SLUG = "gmail-training-data"
+WEIGHTS_SLUG = "gmail-classifier-weights"
 TRAINING_DATA = os.path.join('data', 'training_data.csv')
 METADATA_FILE = os.path.join('config', 'kernel-metadata.json')
+TRAINING_PROGRESS_FILE = os.path.join('state', 'training_progress.json')  # Shared with local_train
+KAGGLE_STATE_FILE = os.path.join('state', 'kaggle_state.json')
+REPLAY_SAMPLES = 200  # Old rows replayed alongside the delta to avoid forgetting
+POLL_INITIAL_DELAY = 15
+POLL_MAX_DELAY = 300
 
 def run_cmd(cmd):
     print(f"🚀 Running: {' '.join(cmd)}")
@@ -20,28 +29,136 @@ def run_cmd(cmd):
         return False
     return result.stdout
 
-def automate_kaggle():
-    if KAGGLE_USERNAME == "YOUR_KAGGLE_USERNAME":
-        print("❌ Please edit 'scripts/kaggle_automate.py' and set your KAGGLE_USERNAME first.")
-        return
+def load_json(path):
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return {}
 
-    # 1. Prepare Dataset Folder
-    dataset_dir = 'kaggle_dataset'
-    if not os.path.exists(dataset_dir): os.makedirs(dataset_dir)
-    shutil.copy(TRAINING_DATA, os.path.join(dataset_dir, 'training_data.csv'))
-    
-    # Create dataset metadata if it doesn't exist
+def save_json(path, data):
+    if not os.path.exists(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+def push_dataset(dataset_dir, slug, title, message):
+    """Creates the Kaggle dataset on first use, otherwise pushes a new version."""
     meta_path = os.path.join(dataset_dir, 'dataset-metadata.json')
     if not os.path.exists(meta_path):
         with open(meta_path, 'w') as f:
             json.dump({
-                "title": "Gmail Training Data",
-                "id": f"{KAGGLE_USERNAME}/{DATASET_SLUG}",
+                "title": title,
+                "id": f"{KAGGLE_USERNAME}/{slug}",
                 "licenses": [{"name": "CC0-1.0"}]
             }, f)
-        run_cmd(['python', '-m', 'kaggle', 'datasets', 'create', '-p', dataset_dir, '--dir-mode', 'zip'])
-    else:
-        run_cmd(['python', '-m', 'kaggle', 'datasets', 'version', '-p', dataset_dir, '-m', "Update weekly data", '--dir-mode', 'zip'])
+        return run_cmd(['python', '-m', 'kaggle', 'datasets', 'create', '-p', dataset_dir, '--dir-mode', 'zip'])
+    return run_cmd(['python', '-m', 'kaggle', 'datasets', 'version', '-p', dataset_dir, '-m', message, '--dir-mode', 'zip'])
+
+def prepare_delta(dataset_dir, last_row_trained):
+    """Writes only the rows added since the last training run, plus a small replay sample."""
+    total_rows = training_index.update_index(TRAINING_DATA)
+    # The performance gate's held-out rows are set aside first and never uploaded
+    perf_gate.create_holdout()
+    held_out = sum(r >= last_row_trained for r in training_index.holdout_rows(TRAINING_DATA))
+    delta_rows = max(0, total_rows - last_row_trained - held_out)
+
+    # The delta is a byte-range copy from the first new row; nothing is parsed
+    with open(TRAINING_DATA, 'rb') as src, open(os.path.join(dataset_dir, 'delta.csv'), 'wb') as dst:
+        dst.write(src.readline())  # CSV header
+        training_index.copy_rows(TRAINING_DATA, last_row_trained, dst)
+
+    replay_path = os.path.join(dataset_dir, 'replay.csv')
+    if last_row_trained > 0:
+        # Sample per label so the minority class is still replayed
+        per_label = REPLAY_SAMPLES // len(training_index.LABEL_CODES)
+        training_index.stratified_sample(TRAINING_DATA, last_row_trained, per_label).to_csv(replay_path, index=False)
+    elif os.path.exists(replay_path):
+        os.remove(replay_path)
+
+    # Drop the full-corpus file left by older versions of this script
+    legacy_path = os.path.join(dataset_dir, 'training_data.csv')
+    if os.path.exists(legacy_path):
+        os.remove(legacy_path)
+    return total_rows, delta_rows
+
+def push_weights_if_changed(kaggle_state):
+    """Uploads the current local weights as a dataset, unless that exact version is already there."""
+    model_dir = model_registry.resolve_model_path()
+    if not model_dir:
+        return False
+    # Registry versions are named by their content hash, so only legacy dirs need hashing
+    active = model_registry.get_active()
+    fingerprint = active if active and model_dir == model_registry.version_path(active) else model_registry.hash_model_dir(model_dir)
+    if fingerprint == kaggle_state.get('weights_fingerprint'):
+        print("♻️ Model weights unchanged since last upload. Reusing Kaggle copy.")
+        return True
+
+    weights_dir = 'kaggle_weights'
+    if not os.path.exists(weights_dir): os.makedirs(weights_dir)
+    for name in os.listdir(weights_dir):
+        if name != 'dataset-metadata.json':
+            os.remove(os.path.join(weights_dir, name))
+    for name in os.listdir(model_dir):
+        if name != model_registry.META_FILE:
+            shutil.copy(os.path.join(model_dir, name), os.path.join(weights_dir, name))
+
+    print("⬆️ Uploading current model weights for warm-starting...")
+    if push_dataset(weights_dir, WEIGHTS_SLUG, "Gmail Classifier Weights", "Update model weights") is False:
+        return False
+    kaggle_state['weights_fingerprint'] = fingerprint
+    return True
+
+def warm_start_source(kaggle_state):
+    """
+    Where the kernel warm-starts from. If the active model is the kernel's own last output,
+    the kernel reads that output directly ('kernel') and nothing is uploaded. Only weights
+    produced elsewhere (local training, an import) are uploaded as a dataset ('dataset').
+    """
+    active = model_registry.get_active()
+    if active and active == kaggle_state.get('kernel_output_version'):
+        print("♻️ Active model is the kernel's last output. Warm-starting from it without an upload.")
+        return 'kernel'
+    return 'dataset' if push_weights_if_changed(kaggle_state) else None
+
+def wait_for_kernel():
+    """Polls the kernel status with exponential backoff. Returns True on completion."""
+    delay = POLL_INITIAL_DELAY
+    while True:
+        status_out = run_cmd(['python', '-m', 'kaggle', 'kernels', 'status', f"{KAGGLE_USERNAME}/{KERNEL_SLUG}"])
+        if not status_out: return False
+        print(status_out.strip())
+        if "complete" in status_out.lower():
+            return True
+        if "error" in status_out.lower():
+            print("❌ Kernel failed on Kaggle.")
+            return False
+        print(f"⏱️ Next check in {delay}s...")
+        time.sleep(delay)
+        delay = min(int(delay * 1.5), POLL_MAX_DELAY)
+
+def automate_kaggle():
+    if KAGGLE_USERNAME == "YOUR_KAGGLE_USERNAME":
+        print("❌ Please edit 'scripts/kaggle_automate.py' and set your KAGGLE_USERNAME first.")
+        return
+
+    # 1. Prepare Dataset Folder (delta rows + replay sample only)
+    dataset_dir = 'kaggle_dataset'
+    if not os.path.exists(dataset_dir): os.makedirs(dataset_dir)
+    last_row_trained = load_json(TRAINING_PROGRESS_FILE).get('last_row_trained', 0)
+    total_rows, delta_rows = prepare_delta(dataset_dir, last_row_trained)
+    if delta_rows == 0:
+        if total_rows > last_row_trained:
+            print("Every new row is in the performance gate's held-out set. Nothing to train on yet.")
+        else:
+            print("No new data since last training run. Skipping.")
+        return
+    print(f"Total Rows: {total_rows} | Uploading delta: {delta_rows}")
+    push_dataset(dataset_dir, DATASET_SLUG, "Gmail Training Data", f"Delta of {delta_rows} rows")
+
+    # Current weights let the kernel warm-start instead of training from scratch
+    kaggle_state = load_json(KAGGLE_STATE_FILE)
+    weights_source = warm_start_source(kaggle_state)
+    save_json(KAGGLE_STATE_FILE, kaggle_state)
 
     # 2. Update Kernel Metadata
     if not os.path.exists(METADATA_FILE):
@@ -52,6 +169,12 @@ def automate_kaggle():
         meta = json.load(f)
     meta['id'] = f"{KAGGLE_USERNAME}/{KERNEL_SLUG}"
     meta['dataset_sources'] = [f"{KAGGLE_USERNAME}/{DATASET_SLUG}"]
+    meta['kernel_sources'] = []
+    if weights_source == 'dataset':
+        meta['dataset_sources'].append(f"{KAGGLE_USERNAME}/{WEIGHTS_SLUG}")
+    elif weights_source == 'kernel':
+        # The previous run's output is mounted as an input of this run
+        meta['kernel_sources'] = [f"{KAGGLE_USERNAME}/{KERNEL_SLUG}"]
     
     # Ensure code_file path is correct for the push (it will be pushed from root)
     meta['code_file'] = os.path.join('scripts', 'kaggle_kernel.py')
@@ -66,33 +189,39 @@ def automate_kaggle():
 
     # 4. Wait for completion
     print("🚦 Polling for completion (this may take 5-10 minutes)...")
-    while True:
-        status_out = run_cmd(['python', '-m', 'kaggle', 'kernels', 'status', f"{KAGGLE_USERNAME}/{KERNEL_SLUG}"])
-        if not status_out: break
-        print(status_out.strip())
-        if "complete" in status_out.lower():
-            break
-        if "error" in status_out.lower():
-            print("❌ Kernel failed on Kaggle.")
-            return
-        time.sleep(30)
+    if not wait_for_kernel():
+        return
 
-    # 5. Download output
+    # 5. Download output into a registry staging dir, so no live model dir is touched
     print("⬇️ Downloading new model weights...")
-    run_cmd(['python', '-m', 'kaggle', 'kernels', 'output', f"{KAGGLE_USERNAME}/{KERNEL_SLUG}", '-p', 'models/'])
+    staging_dir = model_registry.staging_dir()
+    run_cmd(['python', '-m', 'kaggle', 'kernels', 'output', f"{KAGGLE_USERNAME}/{KERNEL_SLUG}", '-p', staging_dir])
 
-    # 6. Unzip and update local model
-    zip_path = os.path.join('models', 'model_output.zip')
+    # 6. Unzip, then register and switch to the new model
+    zip_path = os.path.join(staging_dir, 'model_output.zip')
     if os.path.exists(zip_path):
         print("📦 Unpacking new model...")
+        model_dir = os.path.join(staging_dir, 'unpacked')
         with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall('models/')
+            zip_ref.extractall(model_dir)
+        version = model_registry.register(os.path.join(model_dir, 'email_classifier_model'), 'kaggle',
+                                          training_rows=total_rows, move=True)
         
         # Cleanup
-        os.remove(zip_path)
+        shutil.rmtree(staging_dir)
+        kaggle_state['kernel_output_version'] = version
+        save_json(KAGGLE_STATE_FILE, kaggle_state)
+
+        # Only promote weights that pass the performance gate against the active model
+        if not perf_gate.run_gate(model_registry.version_path(version)):
+            print(f"🛑 Kept the current model. To use the Kaggle one anyway: python scripts/model_registry.py activate {version[:12]}")
+            return
+        model_registry.activate(version)
+        save_json(TRAINING_PROGRESS_FILE, {'last_row_trained': total_rows})
         print("✅ SUCCESS! Local model updated with Kaggle weights.")
     else:
-        print(f"❌ Could not find {zip_path}.")
+        shutil.rmtree(staging_dir)
+        print(f"❌ Could not find model_output.zip in the kernel output.")
 
 if __name__ == "__main__":
     automate_kaggle()
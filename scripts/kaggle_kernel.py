@@ -1,58 +1,127 @@
 import pandas as pd
-from datasets import Dataset
-from transformers import DistilBertForSequenceClassification, DistilBertTokenizer, Trainer, TrainingArguments
+from torch.utils.data import IterableDataset, get_worker_info
+from transformers import (DistilBertForSequenceClassification, DistilBertTokenizer, Trainer, TrainingArguments,
+                          DataCollatorWithPadding)
 import torch
 import os
+import math
+import random
 import zipfile
+import glob
 
 # 1. Setup paths
 # When we push with a dataset, Kaggle puts it in /kaggle/input
 DATASET_NAME = 'gmail-training-data'
-DATA_FILE = f'/kaggle/input/{DATASET_NAME}/training_data.csv'
+DATA_DIR = f'/kaggle/input/{DATASET_NAME}'
+DELTA_FILE = os.path.join(DATA_DIR, 'delta.csv')
+REPLAY_FILE = os.path.join(DATA_DIR, 'replay.csv')
+LEGACY_FILE = os.path.join(DATA_DIR, 'training_data.csv')  # Full-corpus uploads from older versions
+WEIGHTS_DIR = '/kaggle/input/gmail-classifier-weights'  # Locally trained weights, uploaded
+# This kernel's previous output, mounted as a kernel source when it is still the active model
+PREVIOUS_OUTPUT_DIRS = glob.glob('/kaggle/input/*/email_classifier_model')
 OUTPUT_DIR = './email_classifier_model'
 
 print(f"--- 🚀 Kaggle Training Started ---")
 
-if not os.path.exists(DATA_FILE):
-    print(f"Error: {DATA_FILE} not found in Kaggle environment.")
+# 2. Streaming input: the CSV is read in chunks and tokenized on the fly, so memory stays
+# flat however large the corpus is. Mirrors scripts/streaming_dataset.py, inlined because
+# Kaggle only receives this one file.
+LABEL_MAP = {"Application_Confirmation": 0, "Rejected": 1}
+CHUNK_ROWS = 1000
+SHUFFLE_BUFFER = 2000
+HOLDOUT_EVERY = 10   # Up to 1 in 10 delta rows is held out for evaluation...
+MAX_EVAL_ROWS = 500  # ...but never more than this many; every other row is trained on
+
+class StreamingCsvDataset(IterableDataset):
+    def __init__(self, csv_path, tokenizer, extra_rows=None, exclude_rows=(), seed=42):
+        self.csv_path = csv_path
+        self.tokenizer = tokenizer
+        self.extra_rows = extra_rows
+        self.exclude_rows = exclude_rows  # Row numbers of the evaluation set
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def iter_chunks(self):
+        for chunk in pd.read_csv(self.csv_path, chunksize=CHUNK_ROWS):
+            yield chunk[~chunk.index.isin(self.exclude_rows)]
+        if self.extra_rows is not None:
+            yield self.extra_rows
+
+    def __iter__(self):
+        worker = get_worker_info()
+        worker_id, num_workers = (worker.id, worker.num_workers) if worker else (0, 1)
+        rng = random.Random(self.seed + self.epoch * 1000 + worker_id)
+        buffer = []
+        for i, chunk in enumerate(self.iter_chunks()):
+            if i % num_workers != worker_id:
+                continue
+            for example in encode(chunk, self.tokenizer):
+                if len(buffer) < SHUFFLE_BUFFER:
+                    buffer.append(example)
+                    continue
+                j = rng.randrange(len(buffer))
+                yield buffer[j]
+                buffer[j] = example
+        rng.shuffle(buffer)
+        yield from buffer
+
+def encode(chunk, tokenizer):
+    chunk = chunk.assign(label=chunk['label'].map(LABEL_MAP)).dropna(subset=['label', 'full_text'])
+    if chunk.empty:
+        return []
+    encodings = tokenizer(chunk['full_text'].tolist(), truncation=True, max_length=512)
+    return [{**{k: v[i] for k, v in encodings.items()}, 'labels': int(label)} for i, label in enumerate(chunk['label'])]
+
+# Prefer the delta since the last run (plus replayed old rows); older uploads had the full corpus
+train_file = DELTA_FILE if os.path.exists(DELTA_FILE) else LEGACY_FILE
+if not os.path.exists(train_file):
+    print(f"Error: no training data found in {DATA_DIR}.")
     # List files to help debug
     print("Files in current dir:", os.listdir('.'))
     exit(1)
+replay = pd.read_csv(REPLAY_FILE) if train_file == DELTA_FILE and os.path.exists(REPLAY_FILE) else None
 
-# 2. Load and prepare data
-df = pd.read_csv(DATA_FILE)
-label_map = {"Application_Confirmation": 0, "Rejected": 1}
-df['label'] = df['label'].map(label_map)
-df = df.dropna(subset=['label'])
+# Hold out a bounded random sample of the delta for evaluation: one pass counts the rows,
+# a second collects just the sampled ones. Every other row is trained on.
+total_rows = sum(len(chunk) for chunk in pd.read_csv(train_file, usecols=['label'], chunksize=CHUNK_ROWS))
+eval_rows = set(random.Random(42).sample(range(total_rows), min(MAX_EVAL_ROWS, total_rows // HOLDOUT_EVERY)))
+eval_frames = [chunk[chunk.index.isin(eval_rows)] for chunk in pd.read_csv(train_file, chunksize=CHUNK_ROWS)]
+eval_df = pd.concat(eval_frames) if eval_frames else pd.DataFrame(columns=['label', 'full_text'])
+train_rows = total_rows - len(eval_rows) + (len(replay) if replay is not None else 0)
 
-print(f"Training on {len(df)} emails...")
+print(f"Training on {train_rows} emails...")
 
-dataset = Dataset.from_pandas(df)
-tokenizer = DistilBertTokenizer.from_pretrained("distilbert-base-uncased")
+# 3. Load Model (warm-start from the uploaded weights when available)
+weight_dirs = [d for d in [WEIGHTS_DIR] + PREVIOUS_OUTPUT_DIRS if os.path.exists(os.path.join(d, 'config.json'))]
+warm_start = bool(weight_dirs)
+base_model = weight_dirs[0] if warm_start else "distilbert-base-uncased"
+print(f"{f'Warm-starting from {base_model}' if warm_start else 'Cold-starting from DistilBERT base'}...")
 
-def tokenize_function(examples):
-    return tokenizer(examples["full_text"], padding="max_length", truncation=True, max_length=512)
+tokenizer = DistilBertTokenizer.from_pretrained(base_model)
+train_dataset = StreamingCsvDataset(train_file, tokenizer, extra_rows=replay, exclude_rows=eval_rows)
+eval_dataset = encode(eval_df, tokenizer)
 
-tokenized_datasets = dataset.map(tokenize_function, batched=True)
-tokenized_datasets = tokenized_datasets.train_test_split(test_size=0.1)
-
-# 3. Load Model
-# Note: On Kaggle, we usually start fresh or load from a Kaggle Dataset.
-# For simplicity, we start fresh here. 
-model = DistilBertForSequenceClassification.from_pretrained("distilbert-base-uncased", num_labels=2)
+model = DistilBertForSequenceClassification.from_pretrained(base_model, num_labels=2)
 
 device = "cuda" if torch.cuda.is_available() else "cpu"
 model.to(device)
 print(f"Using device: {device}")
 
 # 4. Training Arguments
+# A streamed dataset has no length, so the epochs are expressed as steps
+batch_size = 16 # Higher batch size on GPU
+epochs = 2 if warm_start else 5 # A warm model only needs to absorb the delta
 training_args = TrainingArguments(
     output_dir="./results",
     learning_rate=2e-5,
-    per_device_train_batch_size=16, # Higher batch size on GPU
-    num_train_epochs=5,
+    per_device_train_batch_size=batch_size,
+    max_steps=max(1, math.ceil(train_rows / batch_size)) * epochs,
+    dataloader_num_workers=min(4, os.cpu_count() or 1),
     weight_decay=0.01,
-    eval_strategy="epoch",
+    eval_strategy="epoch" if eval_dataset else "no",
     save_strategy="no", # We save manually at the end
     report_to="none"
 )
@@ -61,8 +130,9 @@ training_args = TrainingArguments(
 trainer = Trainer(
     model=model,
     args=training_args,
-    train_dataset=tokenized_datasets["train"],
-    eval_dataset=tokenized_datasets["test"],
+    train_dataset=train_dataset,
+    eval_dataset=eval_dataset or None,
+    data_collator=DataCollatorWithPadding(tokenizer),
     processing_class=tokenizer,
 )
 
@@ -1,26 +1,26 @@
-import pandas as pd
-from datasets import Dataset
-from transformers import DistilBertForSequenceClassification, DistilBertTokenizer, Trainer, TrainingArguments
+from transformers import (DistilBertForSequenceClassification, DistilBertTokenizer, Trainer, TrainingArguments,
+                          DataCollatorWithPadding)
 import torch
 import os
-import shutil
+import math
 import json
+import model_registry
+import training_index
+import perf_gate
+from streaming_dataset import StreamingCsvDataset
 
 def train_local():
     print("--- 🧠 Starting FAST Delta Training ---")
     dataset_path = os.path.join('data', 'training_data.csv')
-    model_dir = os.path.join('models', 'email_classifier_model')
+    model_dir = model_registry.resolve_model_path()  # Active version, warm-start source
     progress_file = os.path.join('state', 'training_progress.json')
     
     if not os.path.exists(dataset_path):
         print(f"Error: {dataset_path} not found. Run collect_data.py first.")
         return
 
-    # 1. Load the dataset
-    df = pd.read_csv(dataset_path)
-    label_map = {"Application_Confirmation": 0, "Rejected": 1}
-    df['label'] = df['label'].map(label_map)
-    df = df.dropna(subset=['label']) # Ensure valid labels
+    # 1. Count rows from the offset index (only rows appended since the last update are scanned)
+    total_rows = training_index.update_index(dataset_path)
     
     # 2. Delta Check: Only train on UNSEEN rows
     last_row_trained = 0
@@ -29,37 +29,39 @@ def train_local():
             state = json.load(f)
             last_row_trained = state.get('last_row_trained') or state.get('last_processed_count') or 0
 
-    total_rows = len(df)
     if total_rows <= last_row_trained:
         print(f"No new data since last training run. Skipping.")
         return
 
-    # Extract only the "Delta" (new data)
-    new_data = df.iloc[last_row_trained:].copy()
-    print(f"Total Rows: {total_rows} | New for Training: {len(new_data)}")
+    # Set aside the performance gate's held-out rows first, so they are never trained on
+    perf_gate.create_holdout()
+
+    # Only the "Delta" (new data) is streamed for training
+    new_rows = total_rows - last_row_trained - sum(r >= last_row_trained for r in training_index.holdout_rows(dataset_path))
+    print(f"Total Rows: {total_rows} | New for Training: {new_rows}")
+    if new_rows == 0:
+        print("Every new row is in the performance gate's held-out set. Nothing to train on yet.")
+        return
 
     # 3. Anchor Replay (Optional but recommended)
     # Mix new data with a tiny sample of old data to preserve memory
+    anchor_sample = None
     if last_row_trained > 0:
-        old_data = df.iloc[:last_row_trained]
-        anchor_sample = old_data.sample(n=min(len(old_data), 20), random_state=42)
-        training_df = pd.concat([new_data, anchor_sample]).sample(frac=1).reset_index(drop=True)
-        print(f"Training on {len(new_data)} new items + {len(anchor_sample)} anchors.")
+        # Class-stratified: 10 per label, read by seeking to just those rows
+        anchor_sample = training_index.stratified_sample(dataset_path, last_row_trained, per_label=10)
+        print(f"Training on {new_rows} new items + {len(anchor_sample)} anchors.")
     else:
-        training_df = new_data
-        print(f"First-time run: Training on {len(training_df)} items.")
+        print(f"First-time run: Training on {new_rows} items.")
+    train_rows = new_rows + (len(anchor_sample) if anchor_sample is not None else 0)
 
-    # 4. Tokenize
-    tokenizer_path = model_dir if os.path.exists(model_dir) else "distilbert-base-uncased"
+    # 4. Tokenize on the fly in DataLoader workers, padding each batch only to its longest email
+    tokenizer_path = model_dir if model_dir else "distilbert-base-uncased"
     tokenizer = DistilBertTokenizer.from_pretrained(tokenizer_path)
-
-    def tokenize_function(examples):
-        return tokenizer(examples["full_text"], padding="max_length", truncation=True, max_length=512)
-    
-    train_dataset = Dataset.from_pandas(training_df).map(tokenize_function, batched=True)
+    train_dataset = StreamingCsvDataset(dataset_path, tokenizer, max_length=512,
+                                        start_row=last_row_trained, extra_rows=anchor_sample)
 
     # 5. Load Model (Warm-start if exists)
-    if os.path.exists(model_dir):
+    if model_dir:
         print(f"Warm-starting from {model_dir}...")
         model = DistilBertForSequenceClassification.from_pretrained(model_dir, num_labels=2)
     else:
@@ -70,11 +72,15 @@ def train_local():
     model.to(device)
 
     # 6. Training Arguments (Lightweight for fast updates)
+    # A streamed dataset has no length, so the epochs are expressed as steps
+    batch_size = 4 if device == "cpu" else 8
+    epochs = 3 if train_rows < 50 else 2
     training_args = TrainingArguments(
         output_dir="./results",
         learning_rate=2e-5,
-        per_device_train_batch_size=4 if device == "cpu" else 8,
-        num_train_epochs=3 if len(training_df) < 50 else 2,
+        per_device_train_batch_size=batch_size,
+        max_steps=math.ceil(train_rows / batch_size) * epochs,
+        dataloader_num_workers=min(4, os.cpu_count() or 1),
         weight_decay=0.01,
         eval_strategy="no",
         save_strategy="no",
@@ -86,6 +92,7 @@ def train_local():
         model=model,
         args=training_args,
         train_dataset=train_dataset,
+        data_collator=DataCollatorWithPadding(tokenizer),
         processing_class=tokenizer,
     )
 
@@ -93,10 +100,18 @@ def train_local():
     print("Updating weights...")
     trainer.train()
 
-    # 9. Save
-    print(f"Saving model to {model_dir}...")
-    model.save_pretrained(model_dir)
-    tokenizer.save_pretrained(model_dir)
+    # 9. Save into a staging dir and register it
+    staging_dir = model_registry.staging_dir()
+    print(f"Saving model to {staging_dir}...")
+    model.save_pretrained(staging_dir)
+    tokenizer.save_pretrained(staging_dir)
+    version = model_registry.register(staging_dir, 'local_train', training_rows=total_rows, move=True)
+
+    # 10. Switch to it only if it is not slower, heavier or less accurate than the active model
+    if not perf_gate.run_gate(model_registry.version_path(version)):
+        print(f"🛑 Kept the current model. To use this one anyway: python scripts/model_registry.py activate {version[:12]}")
+        return
+    model_registry.activate(version)
     
     with open(progress_file, 'w') as f:
         json.dump({'last_row_trained': total_rows}, f)
@@ -0,0 +1,11 @@
+import sys
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far, or None where `resource` is unavailable."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
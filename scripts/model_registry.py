@@ -0,0 +1,211 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+import uuid
+from datetime import datetime
+
+# --- Configuration ---
+# Every model version lives in models/registry/<content hash>/ and is never modified.
+# ACTIVE.json is the only mutable piece: switching or rolling back rewrites that pointer.
+# A rollback or a hand-picked activation pins the pointer, so Hub updates are not followed.
+REGISTRY_DIR = os.path.join('models', 'registry')
+ACTIVE_FILE = os.path.join(REGISTRY_DIR, 'ACTIVE.json')
+LEGACY_MODEL_DIR = os.path.join('models', 'email_classifier_model')  # Pre-registry location
+META_FILE = 'meta.json'
+HUB_PATTERNS = ["*.json", "*.safetensors", "*.bin", "*.txt"]
+
+def hash_model_dir(path):
+    """Content hash of a model dir: relative paths + bytes of every file except meta.json."""
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            rel_path = os.path.relpath(file_path, path)
+            if rel_path == META_FILE:
+                continue
+            h.update(rel_path.encode())
+            with open(file_path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    h.update(block)
+    return h.hexdigest()
+
+def write_json_atomic(path, data):
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def version_path(version):
+    return os.path.join(REGISTRY_DIR, version)
+
+def read_meta(version):
+    with open(os.path.join(version_path(version), META_FILE), 'r') as f:
+        return json.load(f)
+
+def load_pointer():
+    if os.path.exists(ACTIVE_FILE):
+        with open(ACTIVE_FILE, 'r') as f:
+            return json.load(f)
+    return {'active': None, 'history': []}
+
+def get_active():
+    return load_pointer()['active']
+
+def tracks_hub():
+    """
+    True when the active model was fetched from the Hub and should follow new revisions,
+    i.e. it was not pinned by a rollback or a hand-picked activation.
+    """
+    pointer = load_pointer()
+    active = pointer['active']
+    if not active or pointer.get('pinned') or not os.path.exists(version_path(active)):
+        return False
+    return read_meta(active).get('source') == 'hub'
+
+def list_versions():
+    """Returns (version, meta) pairs, oldest first."""
+    if not os.path.exists(REGISTRY_DIR):
+        return []
+    versions = [
+        (name, read_meta(name)) for name in os.listdir(REGISTRY_DIR)
+        if os.path.exists(os.path.join(REGISTRY_DIR, name, META_FILE))
+    ]
+    return sorted(versions, key=lambda v: v[1].get('registered_at', ''))
+
+def find_version(prefix):
+    matches = [v for v, _ in list_versions() if v.startswith(prefix)]
+    if len(matches) != 1:
+        raise ValueError(f"'{prefix}' matches {len(matches)} registered versions.")
+    return matches[0]
+
+def resolve_model_path():
+    """Directory of the active model: the registry's active version, else the legacy dir, else None."""
+    active = get_active()
+    if active and os.path.exists(version_path(active)):
+        return version_path(active)
+    if os.path.exists(LEGACY_MODEL_DIR):
+        return LEGACY_MODEL_DIR
+    return None
+
+def staging_dir():
+    """A fresh dir inside the registry (same filesystem) to write a candidate model into."""
+    path = os.path.join(REGISTRY_DIR, f".staging-{uuid.uuid4().hex}")
+    os.makedirs(path)
+    return path
+
+def register(src_dir, source, training_rows=None, move=False, **extra):
+    """
+    Stores a model dir under its content hash and returns the version. Registering
+    identical weights again is a no-op. With move=True the source (usually a
+    staging dir) is renamed into place instead of copied.
+    """
+    version = hash_model_dir(src_dir)
+    target = version_path(version)
+    if os.path.exists(target):
+        print(f"♻️ Model {version[:12]} already registered.")
+        if extra:
+            # e.g. remember the Hub revision of weights we pushed ourselves
+            meta = {**read_meta(version), **extra}
+            write_json_atomic(os.path.join(target, META_FILE), meta)
+        if move:
+            shutil.rmtree(src_dir)
+        return version
+
+    if move:
+        tmp_dir = src_dir
+    else:
+        tmp_dir = staging_dir()
+        shutil.copytree(src_dir, tmp_dir, dirs_exist_ok=True)
+
+    meta = {
+        'version': version,
+        'source': source,
+        'training_rows': training_rows,
+        'registered_at': datetime.now().isoformat(timespec='seconds'),
+        **extra
+    }
+    with open(os.path.join(tmp_dir, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    # Directory rename is atomic, so a half-written version is never visible
+    os.rename(tmp_dir, target)
+    print(f"📦 Registered model {version[:12]} (source: {source}).")
+    return version
+
+def activate(version, pinned=False):
+    """Points ACTIVE.json at version. pinned=True (a choice made by hand) stops Hub auto-updates."""
+    if not os.path.exists(version_path(version)):
+        raise ValueError(f"Model version {version} is not registered.")
+    pointer = load_pointer()
+    if pointer['active'] == version and pointer.get('pinned', False) == pinned:
+        return
+    if pointer['active'] and pointer['active'] != version:
+        pointer['history'].append(pointer['active'])
+    pointer['active'] = version
+    pointer['pinned'] = pinned
+    write_json_atomic(ACTIVE_FILE, pointer)
+    print(f"✅ Active model is now {version[:12]}{' (pinned)' if pinned else ''}.")
+
+def rollback():
+    """
+    Re-activates the previously active version. Only the pointer changes. The rollback
+    is pinned, so classify_emails does not switch back to the newest Hub revision.
+    """
+    pointer = load_pointer()
+    if not pointer['history']:
+        print("No previous model version to roll back to.")
+        return None
+    pointer['active'] = pointer['history'].pop()
+    pointer['pinned'] = True
+    write_json_atomic(ACTIVE_FILE, pointer)
+    print(f"⏪ Rolled back to model {pointer['active'][:12]} (pinned; 'fetch <repo_id>' follows the Hub again).")
+    return pointer['active']
+
+def fetch_from_hub(repo_id):
+    """
+    Makes the Hub model available locally and returns its dir. The Hub commit is
+    checked first, so a revision that was already downloaded is never fetched again.
+    """
+    from huggingface_hub import HfApi, snapshot_download
+
+    revision = HfApi().model_info(repo_id).sha
+    for version, meta in list_versions():
+        if meta.get('remote_id') == repo_id and meta.get('remote_revision') == revision:
+            print(f"♻️ Hub revision {revision[:12]} already cached as {version[:12]}.")
+            return version_path(version)
+
+    print(f"🚀 Downloading {repo_id}@{revision[:12]} from the Hub...")
+    tmp_dir = staging_dir()
+    snapshot_download(repo_id, revision=revision, local_dir=tmp_dir, allow_patterns=HUB_PATTERNS)
+    shutil.rmtree(os.path.join(tmp_dir, '.cache'), ignore_errors=True)
+    version = register(tmp_dir, 'hub', move=True, remote_id=repo_id, remote_revision=revision)
+    return version_path(version)
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else 'list'
+    if command == 'list':
+        active = get_active()
+        for version, meta in list_versions():
+            marker = "*" if version == active else " "
+            print(f"{marker} {version[:12]}  {meta['registered_at']}  {meta['source']:<12} rows={meta.get('training_rows')}")
+    elif command == 'activate':
+        activate(find_version(sys.argv[2]), pinned=True)
+    elif command == 'rollback':
+        rollback()
+    elif command == 'import':
+        # Adopts an existing model dir, e.g. the pre-registry models/email_classifier_model
+        src = sys.argv[2] if len(sys.argv) > 2 else LEGACY_MODEL_DIR
+        activate(register(src, 'import'))
+    elif command == 'fetch':
+        path = fetch_from_hub(sys.argv[2])
+        activate(os.path.basename(path))
+    else:
+        print("Usage: python scripts/model_registry.py [list | activate <version> | rollback | import [dir] | fetch <repo_id>]")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+import os
+import json
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+# Importing classify_emails loads the model exactly once for every mailbox
+import classify_emails as ce
+import active_learning
+
+# --- Configuration ---
+USERS_AUTH_DIR = os.path.join('auth', 'users')    # One <user>.json token per mailbox
+USERS_STATE_DIR = os.path.join('state', 'users')  # <user>/state.json and <user>/active_learning/ per mailbox
+USERS_DATA_DIR = os.path.join('data', 'users')    # <user>/runs/ per mailbox, read by extract_metrics --user
+FETCH_WORKERS = 8  # Gmail API calls are I/O bound, threads are enough here
+QUERY_DAYS = 7     # Same window as classify_emails, unless the mailbox's last run is older
+
+def discover_users():
+    """Returns {user: token_path} for every token file in auth/users/."""
+    if not os.path.exists(USERS_AUTH_DIR):
+        return {}
+    return {
+        os.path.splitext(name)[0]: os.path.join(USERS_AUTH_DIR, name)
+        for name in sorted(os.listdir(USERS_AUTH_DIR))
+        if name.endswith('.json')
+    }
+
+def user_runs_dir(user):
+    return os.path.join(USERS_DATA_DIR, user, 'runs')
+
+def load_user_state(user):
+    state_path = os.path.join(USERS_STATE_DIR, user, 'state.json')
+    if os.path.exists(state_path):
+        with open(state_path, 'r') as f:
+            return json.load(f)
+    return {}
+
+def save_user_state(user, state):
+    user_dir = os.path.join(USERS_STATE_DIR, user)
+    if not os.path.exists(user_dir):
+        os.makedirs(user_dir)
+    with open(os.path.join(user_dir, 'state.json'), 'w') as f:
+        json.dump(state, f, indent=2)
+
+def unread_query(state):
+    """
+    Unread mail of the last QUERY_DAYS, or since the mailbox's last completed run if that
+    is older, so a mailbox that was skipped for a while (e.g. an expired token) catches up.
+    """
+    since = datetime.now() - timedelta(days=QUERY_DAYS)
+    if state.get('last_run_ts'):
+        since = min(since, datetime.fromtimestamp(state['last_run_ts'] / 1000) - timedelta(days=1))
+    return f"is:unread after:{since.strftime('%Y/%m/%d')}"
+
+def fetch_candidates(user, token_path):
+    """Builds the user's Gmail service and fetches (id, subject, text, internal_ts) for every unread candidate."""
+    service = ce.get_gmail_service(token_path)
+    if not service:
+        return None, []
+
+    ce.ensure_labels_exist(service)
+    candidates = []
+    for m in ce.get_unread_emails(service, unread_query(load_user_state(user))):
+        try:
+            msg = service.users().messages().get(userId='me', id=m['id']).execute()
+            subject, full_text = ce.get_subject_and_text(msg)
+            candidates.append((m['id'], subject, full_text, int(msg.get('internalDate', 0))))
+        except Exception as e:
+            print(f"[{user}] Error fetching message {m['id']}: {e}")
+    print(f"📥 [{user}] {len(candidates)} unread emails.")
+    return service, candidates
+
+def label_mailbox(user, service, results):
+    for label, ids in results.groupby('label')['id']:
+        try:
+            ce.apply_label_batch(service, ids.tolist(), label)
+        except Exception as e:
+            print(f"[{user}] Error applying '{label}' to {len(ids)} messages: {e}")
+
+def main():
+    users = discover_users()
+    if not users:
+        print(f"No user tokens found in {USERS_AUTH_DIR}. Run scripts/check_labels.py --user <name> for each mailbox.")
+        return
+
+    print(f"👥 Classifying {len(users)} mailboxes with one shared model...")
+
+    # 1. Fetch candidates from all mailboxes concurrently
+    with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(users))) as pool:
+        fetched = dict(zip(users, pool.map(lambda u: fetch_candidates(u, users[u]), users)))
+
+    texts = [c[2] for _, user_candidates in fetched.values() for c in user_candidates]
+    if not texts:
+        print("No new unread emails found in any mailbox.")
+        return
+
+    # 2. Pool every mailbox's emails into shared batches on the forked worker pool
+    print(f"🧠 Running inference on {len(texts)} emails...")
+    latencies = []
+    predictions = ce.predict_parallel(texts, with_details=True, latencies=latencies)
+
+    # 3. Split the predictions back per mailbox
+    results, user_predictions, start = {}, {}, 0
+    for user, (_, user_candidates) in fetched.items():
+        end = start + len(user_candidates)
+        user_predictions[user] = predictions[start:end]
+        results[user] = ce.build_results(user_candidates, user_predictions[user], latencies[start:end])
+        for row in results[user].itertuples():
+            print(f"[{user}] [{row.label}] '{row.subject}' (Conf: {row.confidence:.2f})")
+        start = end
+
+    # 4. Apply labels, one thread per mailbox so each service stays on a single thread
+    if not ce.DRY_RUN:
+        with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(users))) as pool:
+            for user, (service, _) in fetched.items():
+                if service and not results[user].empty:
+                    pool.submit(label_mailbox, user, service, results[user])
+
+    # 5. Each mailbox keeps its own run records and active-learning queue
+    for user, (_, user_candidates) in fetched.items():
+        records = ce.queue_records(user_candidates, user_predictions[user], results[user]['label'])
+        ce.record_run(results[user], records, runs_dir=user_runs_dir(user), al_dir=active_learning.user_dir(user))
+
+    print("\n" + "="*40)
+    print("        MULTI-MAILBOX CLASSIFICATION REPORT")
+    print("="*40)
+    for user, (service, _) in fetched.items():
+        counts = results[user]['label'].value_counts()
+        summary = ", ".join(f"{label}: {counts.get(label, 0)}" for label in ce.CLASSIFIER_LABELS)
+        print(f"📌 {user}: {summary}")
+        if service and not ce.DRY_RUN:
+            # The next run's query reaches back to here
+            state = load_user_state(user)
+            state['last_run_ts'] = int(datetime.now().timestamp() * 1000)
+            state['last_counts'] = {label: int(counts.get(label, 0)) for label in ce.CLASSIFIER_LABELS}
+            save_user_state(user, state)
+
+    if ce.DRY_RUN:
+        print("\n[!] NOTE: This was a DRY RUN. No labels were actually applied in Gmail.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from datetime import datetime
+import pandas as pd
+import model_registry
+import training_index
+from memory_usage import peak_rss_mb
+
+# --- Configuration ---
+# A candidate model is benchmarked against the active one on the same fixed held-out set.
+# Each model runs in its own subprocess so peak memory is measured per model.
+DATASET_PATH = os.path.join('data', 'training_data.csv')
+HOLDOUT_FILE = os.path.join('data', 'gate_holdout.csv')  # Created once, then never changes
+HOLDOUT_PER_LABEL = 100     # Most rows set aside per label...
+HOLDOUT_FRACTION = 0.10     # ...and never more than this share of a label's untrained rows
+MIN_HOLDOUT_PER_LABEL = 10  # Fewer than this per label and the gate waits for more data
+TRAINING_PROGRESS_FILE = os.path.join('state', 'training_progress.json')  # Written by training
+CONFIG_FILE = os.path.join('config', 'perf_gate.json')
+REPORT_DIR = os.path.join('state', 'perf_gate')
+BATCH_SIZE = 16           # Same as classify_emails
+LATENCY_SAMPLES = 50      # Single-email forward passes timed for p95
+REPEATS = 5               # Timed passes per benchmark process; the median is kept
+ROUNDS = 3                # Benchmark processes per model, alternating candidate and baseline
+DEFAULT_THRESHOLDS = {
+    'max_throughput_drop': 0.20,       # Fraction of the active model's emails/s
+    'max_p95_latency_increase': 0.25,  # Fraction of the active model's p95 ms
+    'max_memory_increase': 0.25,       # Fraction of the active model's peak RSS
+    'max_accuracy_drop': 0.02          # Absolute accuracy points
+}
+
+def load_thresholds():
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    if os.path.exists(CONFIG_FILE):
+        with open(CONFIG_FILE, 'r') as f:
+            thresholds.update(json.load(f))
+    return thresholds
+
+def create_holdout():
+    """
+    Sets aside the fixed set of cleaned emails every candidate is measured on, once.
+    Training calls this before it picks its rows. The set is sampled per label from rows
+    no model has trained on yet, capped at HOLDOUT_FRACTION of each label so training
+    keeps most of every class. Until each label can spare MIN_HOLDOUT_PER_LABEL rows no
+    set is created and the gate is skipped.
+    """
+    if os.path.exists(HOLDOUT_FILE) and training_index.holdout_rows(DATASET_PATH):
+        return
+    if not os.path.exists(DATASET_PATH):
+        return
+    last_row_trained = 0
+    if os.path.exists(TRAINING_PROGRESS_FILE):
+        with open(TRAINING_PROGRESS_FILE, 'r') as f:
+            state = json.load(f)
+            last_row_trained = state.get('last_row_trained') or state.get('last_processed_count') or 0
+
+    n_rows = training_index.update_index(DATASET_PATH)
+    counts = training_index.label_counts(DATASET_PATH, last_row_trained, n_rows)
+    per_label = {code: min(HOLDOUT_PER_LABEL, int(counts.get(code, 0) * HOLDOUT_FRACTION))
+                 for code in training_index.LABEL_CODES.values()}
+    if min(per_label.values()) < MIN_HOLDOUT_PER_LABEL:
+        print(f"ℹ️ Too few untrained emails per label to spare a gate held-out set "
+              f"(need {MIN_HOLDOUT_PER_LABEL / HOLDOUT_FRACTION:.0f} of each). Training on all of them.")
+        return
+
+    rows = training_index.stratified_rows(DATASET_PATH, n_rows, per_label, start_row=last_row_trained)
+    holdout = training_index.read_rows(DATASET_PATH, rows)
+    holdout.to_csv(HOLDOUT_FILE, index=False)
+    training_index.set_holdout(DATASET_PATH, rows)
+    print(f"📌 Created gate held-out set with {len(holdout)} emails: {HOLDOUT_FILE}")
+
+def load_holdout():
+    """The gate's held-out set, or None if create_holdout has not set one aside yet."""
+    if not os.path.exists(HOLDOUT_FILE) or not training_index.holdout_rows(DATASET_PATH):
+        return None
+    return pd.read_csv(HOLDOUT_FILE).dropna(subset=['label', 'full_text'])
+
+def benchmark(model_dir):
+    """Measures one model in this process. Run through measure() to get a clean peak RSS."""
+    import torch
+    from transformers import DistilBertForSequenceClassification, DistilBertTokenizer
+
+    holdout = load_holdout()
+    texts = holdout['full_text'].tolist()
+    label_ids = {v: k for k, v in training_index.LABEL_CODES.items()}
+
+    # Loaded the way classify_emails loads it, so the numbers match a real run
+    model = DistilBertForSequenceClassification.from_pretrained(model_dir)
+    tokenizer = DistilBertTokenizer.from_pretrained(model_dir)
+    max_length = min(tokenizer.model_max_length, 512)
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model.to(device)
+    model.eval()
+
+    def forward(batch):
+        inputs = tokenizer(batch, return_tensors="pt", padding=True, truncation=True, max_length=max_length).to(device)
+        with torch.no_grad():
+            return model(**inputs).logits.argmax(dim=1).tolist()
+
+    forward(texts[:BATCH_SIZE])  # Warm-up
+
+    # Timings are repeated and the median kept, so one busy moment doesn't decide the gate
+    throughputs, p95s = [], []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        preds = []
+        for i in range(0, len(texts), BATCH_SIZE):
+            preds.extend(forward(texts[i:i + BATCH_SIZE]))
+        throughputs.append(len(texts) / (time.perf_counter() - start))
+
+        latencies = []
+        for text in texts[:LATENCY_SAMPLES]:
+            start = time.perf_counter()
+            forward([text])
+            latencies.append((time.perf_counter() - start) * 1000)
+        p95s.append(pd.Series(latencies).quantile(0.95))
+
+    correct = sum(label_ids[p] == label for p, label in zip(preds, holdout['label']))
+    return {
+        'emails': len(texts),
+        'throughput_per_s': float(pd.Series(throughputs).median()),
+        'p95_latency_ms': float(pd.Series(p95s).median()),
+        'peak_rss_mb': peak_rss_mb(),  # None on Windows
+        'accuracy': correct / len(texts),
+        'max_length': max_length
+    }
+
+def measure(model_dir):
+    """Benchmarks a model in a fresh subprocess so its memory is not mixed with another model's."""
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--bench', model_dir],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Benchmark of {model_dir} failed:\n{result.stderr[-2000:]}")
+    try:
+        return json.loads(result.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        raise RuntimeError(f"Benchmark of {model_dir} printed no result:\n{result.stdout[-2000:]}")
+
+def measure_rounds(model_dirs):
+    """
+    Runs ROUNDS benchmark processes per model, alternating between the models so a
+    slowdown of the machine hits both. Returns each model's per-metric medians.
+    """
+    rounds = {model_dir: [] for model_dir in model_dirs}
+    for _ in range(ROUNDS):
+        for model_dir in model_dirs:
+            rounds[model_dir].append(measure(model_dir))
+    medians = [pd.DataFrame(rounds[model_dir]).median(skipna=False) for model_dir in model_dirs]
+    # Unmeasurable values (peak memory on Windows) stay None
+    return [{key: None if pd.isna(value) else float(value) for key, value in m.items()} for m in medians]
+
+def compare(candidate, baseline, thresholds):
+    """Returns a list of human-readable threshold violations (empty = pass)."""
+    failures = []
+    throughput_drop = 1 - candidate['throughput_per_s'] / baseline['throughput_per_s']
+    if throughput_drop > thresholds['max_throughput_drop']:
+        failures.append(f"throughput dropped {throughput_drop:.0%} "
+                        f"({baseline['throughput_per_s']:.1f} -> {candidate['throughput_per_s']:.1f} emails/s)")
+    latency_increase = candidate['p95_latency_ms'] / baseline['p95_latency_ms'] - 1
+    if latency_increase > thresholds['max_p95_latency_increase']:
+        failures.append(f"p95 latency rose {latency_increase:.0%} "
+                        f"({baseline['p95_latency_ms']:.1f} -> {candidate['p95_latency_ms']:.1f} ms)")
+    memory_increase = candidate['peak_rss_mb'] / baseline['peak_rss_mb'] - 1 if baseline['peak_rss_mb'] else 0
+    if memory_increase > thresholds['max_memory_increase']:
+        failures.append(f"peak memory rose {memory_increase:.0%} "
+                        f"({baseline['peak_rss_mb']:.0f} -> {candidate['peak_rss_mb']:.0f} MB)")
+    accuracy_drop = baseline['accuracy'] - candidate['accuracy']
+    if accuracy_drop > thresholds['max_accuracy_drop']:
+        failures.append(f"accuracy dropped {accuracy_drop:.3f} "
+                        f"({baseline['accuracy']:.3f} -> {candidate['accuracy']:.3f})")
+    return failures
+
+def model_id(model_dir):
+    """Registry versions are named by their content hash; other dirs are hashed."""
+    if os.path.dirname(os.path.normpath(model_dir)) == os.path.normpath(model_registry.REGISTRY_DIR):
+        return os.path.basename(os.path.normpath(model_dir))
+    return model_registry.hash_model_dir(model_dir)
+
+def report_path(model_dir):
+    return os.path.join(REPORT_DIR, f"{model_id(model_dir)}.json")
+
+def load_report(model_dir):
+    path = report_path(model_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def default_baseline(candidate_dir):
+    """The active model, or the one active before it when the candidate is already active."""
+    active_dir = model_registry.resolve_model_path()
+    if active_dir and model_id(active_dir) == model_id(candidate_dir):
+        history = model_registry.load_pointer()['history']
+        return model_registry.version_path(history[-1]) if history else None
+    return active_dir
+
+def run_gate(candidate_dir, baseline_dir=None):
+    """
+    Benchmarks candidate_dir against baseline_dir (default: see default_baseline), saves the
+    comparison to state/perf_gate/<version>.json and returns True if it may be promoted.
+    """
+    baseline_dir = baseline_dir or default_baseline(candidate_dir)
+    print("--- 🚦 Performance Gate ---")
+    if load_holdout() is None:
+        print("⚠️ No held-out set yet (too little training data to spare one). Skipping the gate.")
+        return True
+
+    thresholds = load_thresholds()
+    report = {
+        'candidate': model_id(candidate_dir),
+        'baseline': model_id(baseline_dir) if baseline_dir else None,
+        'thresholds': thresholds,
+        'checked_at': datetime.now().isoformat(timespec='seconds')
+    }
+    report['candidate_metrics'] = report['baseline_metrics'] = None
+    try:
+        if baseline_dir and report['baseline'] != report['candidate']:
+            print(f"Benchmarking candidate {report['candidate'][:12]} against {report['baseline'][:12]} ({ROUNDS} rounds)...")
+            report['candidate_metrics'], report['baseline_metrics'] = measure_rounds([candidate_dir, baseline_dir])
+            report['failures'] = compare(report['candidate_metrics'], report['baseline_metrics'], thresholds)
+        else:
+            # First model (or the same weights): nothing to regress against
+            print(f"Benchmarking candidate {report['candidate'][:12]}...")
+            report['candidate_metrics'] = measure(candidate_dir)
+            report['failures'] = []
+    except RuntimeError as e:
+        # A model that cannot even be benchmarked is not promoted
+        report['failures'] = [str(e)]
+    report['passed'] = not report['failures']
+
+    if not os.path.exists(REPORT_DIR):
+        os.makedirs(REPORT_DIR)
+    model_registry.write_json_atomic(report_path(candidate_dir), report)
+
+    c, b = report['candidate_metrics'], report['baseline_metrics']
+    for key, label, fmt in [('throughput_per_s', 'Throughput (emails/s)', '.1f'), ('p95_latency_ms', 'p95 latency (ms)', '.1f'),
+                            ('peak_rss_mb', 'Peak memory (MB)', '.0f'), ('accuracy', 'Accuracy', '.3f')]:
+        if not c or c[key] is None:
+            continue  # Benchmark failed, or peak memory is not measurable on Windows
+        baseline_value = format(b[key], fmt) if b else "-"
+        print(f"  {label:<22} candidate {format(c[key], fmt)} | baseline {baseline_value}")
+    if report['passed']:
+        print("✅ Performance gate passed.")
+    else:
+        print("❌ Performance gate failed:")
+        for failure in report['failures']:
+            print(f"  - {failure}")
+        print(f"Report: {report_path(candidate_dir)}")
+    return report['passed']
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark a candidate model against the active one.")
+    parser.add_argument('candidate', nargs='?', help="Model dir or registry version prefix (default: the active model)")
+    parser.add_argument('--baseline', help="Model dir or registry version prefix to compare against")
+    parser.add_argument('--bench', metavar='MODEL_DIR', help=argparse.SUPPRESS)  # Internal: one-model subprocess
+    args = parser.parse_args()
+
+    if args.bench:
+        print(json.dumps(benchmark(args.bench)))
+        return
+
+    def resolve(arg):
+        if arg and not os.path.exists(arg):
+            return model_registry.version_path(model_registry.find_version(arg))
+        return arg
+
+    candidate = resolve(args.candidate) or model_registry.resolve_model_path()
+    if not candidate:
+        print("❌ No model to check. Train one first.")
+        return
+    sys.exit(0 if run_gate(candidate, resolve(args.baseline)) else 1)
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,25 @@
 import os
+import sys
 from huggingface_hub import HfApi, create_repo
+import model_registry
+import perf_gate
 from transformers import DistilBertForSequenceClassification, DistilBertTokenizer
 
-def push_to_hub():
-    model_path = os.path.join('models', 'email_classifier_model')
+def push_to_hub(model_path=None):
+    # Pass a different dir (e.g. models/email_classifier_student) to publish it instead
+    model_path = model_path or model_registry.resolve_model_path()
     
-    if not os.path.exists(model_path):
+    if not model_path or not os.path.exists(model_path):
         print(f"❌ Error: Local model not found at {model_path}")
         return
 
+    # Everyone who uses the Hub model gets this one, so it must have passed the gate
+    report = perf_gate.load_report(model_path)
+    passed = report['passed'] if report else perf_gate.run_gate(model_path)
+    if not passed:
+        print(f"❌ {model_path} failed the performance gate; not publishing it. See {perf_gate.report_path(model_path)}")
+        return
+
     print("--- 🚀 Hugging Face Hub Upload ---")
     repo_id = input("Enter your Hugging Face repo name (e.g., 'your-username/gmail-classifier'): ").strip()
     hf_token = input("Enter your Hugging Face Write Token: ").strip()
@@ -39,4 +50,4 @@ def push_to_hub():
         print(f"❌ Failed to push to hub: {e}")
 
 if __name__ == "__main__":
-    push_to_hub()
+    push_to_hub(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,78 @@
+import random
+import pandas as pd
+import training_index
+from torch.utils.data import IterableDataset, get_worker_info
+
+LABEL_MAP = {"Application_Confirmation": 0, "Rejected": 1}
+CHUNK_ROWS = 1000       # Rows parsed from the CSV at a time
+SHUFFLE_BUFFER = 2000   # Examples held for shuffling per worker
+
+class StreamingCsvDataset(IterableDataset):
+    """
+    Streams training_data.csv in chunks and tokenizes on the fly, so memory stays
+    bounded by CHUNK_ROWS + SHUFFLE_BUFFER no matter how large the corpus grows.
+
+    With DataLoader workers, chunks are dealt round-robin: every worker parses the CSV
+    but only tokenizes its own chunks. Examples are unpadded; pair this with
+    DataCollatorWithPadding so each batch is padded only to its longest email.
+    """
+
+    def __init__(self, csv_path, tokenizer, max_length=512, start_row=0, extra_rows=None,
+                 chunk_rows=CHUNK_ROWS, shuffle_buffer=SHUFFLE_BUFFER, seed=42):
+        self.csv_path = csv_path
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self.start_row = start_row      # First row not trained on yet (delta training)
+        self.extra_rows = extra_rows    # Small in-memory DataFrame, e.g. replay anchors
+        self.chunk_rows = chunk_rows
+        self.shuffle_buffer = shuffle_buffer
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        # Called by Trainer each epoch so the shuffle order changes
+        self.epoch = epoch
+
+    def iter_chunks(self):
+        """
+        Yields DataFrame chunks of the rows to train on. The index seeks straight past the
+        rows already trained on, and perf_gate's held-out rows are skipped.
+        """
+        holdout = training_index.holdout_rows(self.csv_path)
+        with open(self.csv_path, 'rb') as f:
+            f.seek(training_index.row_offset(self.csv_path, self.start_row))
+            for chunk in pd.read_csv(f, header=None, names=training_index.COLUMNS, chunksize=self.chunk_rows):
+                chunk.index += self.start_row  # Row numbers in the CSV
+                yield chunk[~chunk.index.isin(holdout)]
+        if self.extra_rows is not None and not self.extra_rows.empty:
+            yield self.extra_rows
+
+    def encode(self, chunk):
+        chunk = chunk.assign(label=chunk['label'].map(LABEL_MAP)).dropna(subset=['label', 'full_text'])
+        if chunk.empty:
+            return []
+        encodings = self.tokenizer(chunk['full_text'].tolist(), truncation=True, max_length=self.max_length)
+        return [
+            {**{key: values[i] for key, values in encodings.items()}, 'labels': int(label)}
+            for i, label in enumerate(chunk['label'])
+        ]
+
+    def __iter__(self):
+        worker = get_worker_info()
+        worker_id, num_workers = (worker.id, worker.num_workers) if worker else (0, 1)
+        rng = random.Random(self.seed + self.epoch * 1000 + worker_id)
+
+        buffer = []
+        for i, chunk in enumerate(self.iter_chunks()):
+            if i % num_workers != worker_id:
+                continue
+            for example in self.encode(chunk):
+                if len(buffer) < self.shuffle_buffer:
+                    buffer.append(example)
+                    continue
+                # Bounded shuffle: emit a random buffered example, keep the new one
+                j = rng.randrange(len(buffer))
+                yield buffer[j]
+                buffer[j] = example
+        rng.shuffle(buffer)
+        yield from buffer
@@ -0,0 +1,191 @@
+import os
+import io
+import struct
+import random
+import shutil
+import pandas as pd
+
+# Sidecar index for training_data.csv: one fixed-size record (byte offset, label code)
+# per row, so row i is found by seeking to HEADER.size + i * RECORD.size in the index.
+# The header remembers how many CSV bytes are indexed; appends only scan the new tail.
+MAGIC = b'TIDX'
+HEADER = struct.Struct('<4sIQ')  # magic, version, indexed CSV bytes
+RECORD = struct.Struct('<QB')    # row byte offset, label code
+ROW = struct.Struct('<Q')        # one held-out row number
+VERSION = 1
+LABEL_CODES = {"Application_Confirmation": 0, "Rejected": 1}
+UNKNOWN_LABEL = 255
+COLUMNS = ['label', 'full_text']
+
+def index_path(csv_path):
+    return csv_path + '.idx'
+
+def holdout_path(csv_path):
+    # Row numbers set aside for perf_gate's held-out set; training never reads them
+    return csv_path + '.holdout'
+
+def _label_code(row_bytes):
+    label = row_bytes.split(b',', 1)[0].strip().strip(b'"').decode('utf-8', errors='ignore')
+    return LABEL_CODES.get(label, UNKNOWN_LABEL)
+
+def _scan_rows(f, start):
+    """
+    Yields (offset, end, label code) for every complete CSV row from `start`. A row ends
+    at a newline outside quotes; doubled "" escapes keep the quote count even.
+    """
+    f.seek(start)
+    offset, row, quotes = start, b'', 0
+    for line in f:
+        row += line
+        quotes += line.count(b'"')
+        if quotes % 2 == 0 and line.endswith(b'\n'):
+            yield offset, offset + len(row), _label_code(row)
+            offset, row, quotes = offset + len(row), b'', 0
+    # A trailing row without its newline is still being written; it is indexed next time
+
+def _n_rows(idx_path):
+    return (os.path.getsize(idx_path) - HEADER.size) // RECORD.size
+
+def _row_offset(idx, row):
+    idx.seek(HEADER.size + row * RECORD.size)
+    return RECORD.unpack(idx.read(RECORD.size))[0]
+
+def update_index(csv_path):
+    """
+    Brings the index up to date with the CSV and returns the row count. Only bytes
+    appended since the last update are scanned. If the CSV shrank (e.g. collect_data
+    rolled back an uncommitted chunk), rows past the new end are dropped.
+    """
+    idx_path = index_path(csv_path)
+    if not os.path.exists(csv_path):
+        if os.path.exists(idx_path):
+            os.remove(idx_path)
+        return 0
+
+    csv_size = os.path.getsize(csv_path)
+    with open(idx_path, 'r+b' if os.path.exists(idx_path) else 'w+b') as idx, open(csv_path, 'rb') as f:
+        data = idx.read(HEADER.size)
+        valid = len(data) == HEADER.size and HEADER.unpack(data)[:2] == (MAGIC, VERSION)
+        header_end = len(f.readline())
+        indexed_size = HEADER.unpack(data)[2] if valid else header_end
+        n_rows = _n_rows(idx_path) if valid else 0
+
+        if csv_size < indexed_size:
+            # Drop rows that start past the new end; the last survivor may be cut short,
+            # so it is dropped too and rescanned
+            while n_rows and _row_offset(idx, n_rows - 1) >= csv_size:
+                n_rows -= 1
+            if n_rows:
+                n_rows -= 1
+                indexed_size = _row_offset(idx, n_rows)
+            else:
+                indexed_size = header_end
+
+        idx.truncate(HEADER.size + n_rows * RECORD.size)
+        idx.seek(HEADER.size + n_rows * RECORD.size)
+        for offset, end, code in _scan_rows(f, indexed_size):
+            idx.write(RECORD.pack(offset, code))
+            indexed_size = end
+            n_rows += 1
+
+        idx.seek(0)
+        idx.write(HEADER.pack(MAGIC, VERSION, indexed_size))
+    return n_rows
+
+def row_offset(csv_path, row):
+    """Byte offset of `row` in the CSV (the file size when row == row count)."""
+    n_rows = update_index(csv_path)
+    if row >= n_rows:
+        return os.path.getsize(csv_path)
+    with open(index_path(csv_path), 'rb') as idx:
+        return _row_offset(idx, row)
+
+def read_rows(csv_path, rows):
+    """Reads just the given row numbers by seeking straight to them."""
+    rows = sorted(rows)
+    if not rows:
+        return pd.DataFrame(columns=COLUMNS)
+    n_rows = update_index(csv_path)
+    parts = []
+    with open(index_path(csv_path), 'rb') as idx, open(csv_path, 'rb') as f:
+        indexed_size = HEADER.unpack(idx.read(HEADER.size))[2]
+        for row in rows:
+            start = _row_offset(idx, row)
+            end = _row_offset(idx, row + 1) if row + 1 < n_rows else indexed_size
+            f.seek(start)
+            parts.append(f.read(end - start))
+    return pd.read_csv(io.BytesIO(b''.join(parts)), header=None, names=COLUMNS)
+
+def holdout_rows(csv_path):
+    """Sorted row numbers of the held-out set, or [] if none was set aside yet."""
+    path = holdout_path(csv_path)
+    if not os.path.exists(path):
+        return []
+    with open(path, 'rb') as f:
+        return [row for (row,) in ROW.iter_unpack(f.read())]
+
+def set_holdout(csv_path, rows):
+    path = holdout_path(csv_path)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(b''.join(ROW.pack(row) for row in sorted(rows)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+
+def copy_rows(csv_path, start_row, dst):
+    """Copies the raw bytes of every row from start_row on into dst, minus held-out rows."""
+    offset = row_offset(csv_path, start_row)
+    with open(csv_path, 'rb') as src:
+        for row in holdout_rows(csv_path):
+            if row < start_row:
+                continue
+            # Copy up to the held-out row, then jump past it
+            end = row_offset(csv_path, row)
+            src.seek(offset)
+            dst.write(src.read(end - offset))
+            offset = row_offset(csv_path, row + 1)
+        src.seek(offset)
+        shutil.copyfileobj(src, dst)
+
+def _labelled_rows(csv_path, start_row, end_row):
+    """Yields (row, label code) for rows start_row..end_row-1 with a known label, outside the held-out set."""
+    update_index(csv_path)
+    excluded = set(holdout_rows(csv_path))
+    with open(index_path(csv_path), 'rb') as idx:
+        idx.seek(HEADER.size + start_row * RECORD.size)
+        for start in range(start_row, end_row, 4096):
+            block = idx.read(RECORD.size * min(4096, end_row - start))
+            for i, (_, code) in enumerate(RECORD.iter_unpack(block)):
+                if code != UNKNOWN_LABEL and start + i not in excluded:
+                    yield start + i, code
+
+def label_counts(csv_path, start_row, end_row):
+    """Rows per label code among start_row..end_row-1, from the index records alone."""
+    counts = {}
+    for _, code in _labelled_rows(csv_path, start_row, end_row):
+        counts[code] = counts.get(code, 0) + 1
+    return counts
+
+def stratified_rows(csv_path, end_row, per_label, seed=42, start_row=0):
+    """
+    Class-stratified reservoir sample of up to per_label row numbers of each label among
+    rows start_row..end_row-1, never from the held-out set. per_label is one cap for
+    every label or a {label code: cap} dict. Only the 9-byte index records are scanned.
+    """
+    rng = random.Random(seed)
+    reservoirs, seen = {}, {}
+    for row, code in _labelled_rows(csv_path, start_row, end_row):
+        cap = per_label.get(code, 0) if isinstance(per_label, dict) else per_label
+        seen[code] = seen.get(code, 0) + 1
+        reservoir = reservoirs.setdefault(code, [])
+        if len(reservoir) < cap:
+            reservoir.append(row)
+        else:
+            j = rng.randrange(seen[code])
+            if j < cap:
+                reservoir[j] = row
+    return [row for reservoir in reservoirs.values() for row in reservoir]
+
+def stratified_sample(csv_path, end_row, per_label, seed=42):
+    """stratified_rows, read from the CSV by seeking to just the chosen rows."""
+    return read_rows(csv_path, stratified_rows(csv_path, end_row, per_label, seed))
@@ -0,0 +1,247 @@
+import os
+import json
+import time
+import argparse
+from datetime import datetime, timedelta
+from googleapiclient.errors import HttpError
+
+# Importing classify_emails loads the model once; it stays warm for every event
+import classify_emails as ce
+
+# --- Configuration ---
+WATCH_STATE_FILE = os.path.join('state', 'watch_state.json')
+MIN_POLL_INTERVAL = 5     # Seconds between history.list calls right after activity
+MAX_POLL_INTERVAL = 120   # Polling slows down to this while the mailbox is quiet
+MICRO_BATCH_WINDOW = 3    # Seconds to keep collecting a burst before classifying it
+MICRO_BATCH_MAX = 32      # ...or fewer, once this many ids are waiting
+WATCH_RENEW_EVERY = timedelta(days=1)  # Gmail watch() expires after 7 days
+
+class NotificationSource:
+    """
+    Yields new message ids. wait_for_ids() blocks up to `timeout` seconds. Ids handed out
+    are only acknowledged by commit(), once they are classified; rollback() hands them out
+    again after a failure.
+    """
+
+    def wait_for_ids(self, timeout):
+        raise NotImplementedError
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+class HistoryPollSource(NotificationSource):
+    """
+    Adaptive poll of users.history.list. Only the changes since the last seen historyId
+    are fetched, so each tick costs one small request instead of re-listing 7 days.
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self.history_id = self.committed_history_id = self._load_history_id()
+        self.interval = MIN_POLL_INTERVAL
+        self.next_poll = 0
+
+    def _load_history_id(self):
+        if os.path.exists(WATCH_STATE_FILE):
+            with open(WATCH_STATE_FILE, 'r') as f:
+                history_id = json.load(f).get('history_id')
+            if history_id:
+                return history_id
+        return self._current_history_id()
+
+    def _current_history_id(self):
+        return self.service.users().getProfile(userId='me').execute()['historyId']
+
+    def _save_history_id(self):
+        if not os.path.exists(os.path.dirname(WATCH_STATE_FILE)):
+            os.makedirs(os.path.dirname(WATCH_STATE_FILE))
+        with open(WATCH_STATE_FILE, 'w') as f:
+            json.dump({'history_id': self.history_id}, f)
+
+    def fetch_new_ids(self):
+        """Returns ids of unread inbox messages added since the last call."""
+        ids, page_token = [], None
+        try:
+            while True:
+                results = self.service.users().history().list(
+                    userId='me', startHistoryId=self.history_id, historyTypes=['messageAdded'],
+                    labelId='INBOX', pageToken=page_token
+                ).execute()
+                for record in results.get('history', []):
+                    for added in record.get('messagesAdded', []):
+                        labels = added['message'].get('labelIds', [])
+                        if 'UNREAD' in labels and 'INBOX' in labels:
+                            ids.append(added['message']['id'])
+                page_token = results.get('nextPageToken')
+                if not page_token:
+                    break
+            self.history_id = results.get('historyId', self.history_id)
+        except HttpError as e:
+            if e.resp.status != 404:
+                raise
+            # historyId too old (Gmail keeps about a week); restart from now
+            print("⚠️ History expired. Run scripts/classify_emails.py once to catch up.")
+            self.history_id = self._current_history_id()
+        return list(dict.fromkeys(ids))
+
+    def commit(self):
+        if self.history_id != self.committed_history_id:
+            self._save_history_id()
+            self.committed_history_id = self.history_id
+
+    def rollback(self):
+        self.history_id = self.committed_history_id
+
+    def wait_for_ids(self, timeout):
+        wait = self.next_poll - time.time()
+        if wait > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(0, wait))
+
+        ids = self.fetch_new_ids()
+        # Poll fast while mail is arriving, back off while the mailbox is quiet
+        self.interval = MIN_POLL_INTERVAL if ids else min(self.interval * 2, MAX_POLL_INTERVAL)
+        self.next_poll = time.time() + self.interval
+        return ids
+
+class PubSubSource(NotificationSource):
+    """
+    Gmail watch() + a Cloud Pub/Sub pull subscription. Each notification only carries a
+    historyId, so the actual ids are still read through history.list.
+    Needs `pip install google-cloud-pubsub` and a topic Gmail may publish to.
+    """
+
+    def __init__(self, service, topic, subscription):
+        from google.cloud import pubsub_v1
+
+        self.service = service
+        self.topic = topic
+        self.subscription = subscription
+        self.subscriber = pubsub_v1.SubscriberClient()
+        self.history = HistoryPollSource(service)
+        self.watch_renewed_at = None
+
+    def _renew_watch(self):
+        if self.watch_renewed_at and datetime.now() - self.watch_renewed_at < WATCH_RENEW_EVERY:
+            return
+        self.service.users().watch(userId='me', body={'topicName': self.topic, 'labelIds': ['INBOX']}).execute()
+        self.watch_renewed_at = datetime.now()
+
+    def wait_for_ids(self, timeout):
+        self._renew_watch()
+        response = self.subscriber.pull(
+            request={'subscription': self.subscription, 'max_messages': 100}, timeout=max(timeout, 1)
+        )
+        if not response.received_messages:
+            return []
+        self.subscriber.acknowledge(request={
+            'subscription': self.subscription,
+            'ack_ids': [m.ack_id for m in response.received_messages]
+        })
+        return self.history.fetch_new_ids()
+
+    def commit(self):
+        self.history.commit()
+
+    def rollback(self):
+        self.history.rollback()
+
+class FileSource(NotificationSource):
+    """
+    Local stand-in for push notifications: tails a text file with one message id per line.
+    `echo <message_id> >> events.txt` drives the watcher without any Google Cloud setup.
+    """
+
+    def __init__(self, path, poll_interval=0.5):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.offset = self.committed_offset = os.path.getsize(path) if os.path.exists(path) else 0
+
+    def wait_for_ids(self, timeout):
+        deadline = time.time() + timeout
+        while True:
+            if os.path.exists(self.path) and os.path.getsize(self.path) > self.offset:
+                with open(self.path, 'rb') as f:
+                    f.seek(self.offset)
+                    data = f.read()
+                # Leave a partially written last line for the next read
+                complete = data[:data.rfind(b'\n') + 1]
+                self.offset += len(complete)
+                ids = complete.decode().split()
+                if ids:
+                    return ids
+            if time.time() >= deadline:
+                return []
+            time.sleep(min(self.poll_interval, max(0, deadline - time.time())))
+
+    def commit(self):
+        self.committed_offset = self.offset
+
+    def rollback(self):
+        self.offset = self.committed_offset
+
+def collect_burst(source, first_ids):
+    """Micro-batches a burst: keeps reading ids for a short window so they share one forward pass."""
+    ids = list(first_ids)
+    deadline = time.time() + MICRO_BATCH_WINDOW
+    while len(ids) < MICRO_BATCH_MAX and time.time() < deadline:
+        ids.extend(source.wait_for_ids(deadline - time.time()))
+    return list(dict.fromkeys(ids))
+
+def watch(source, service):
+    """
+    The event loop. A failed iteration (network error, expired token, Gmail 5xx) is logged
+    and retried with backoff instead of ending the watcher; its ids are handed out again.
+    """
+    backoff = MIN_POLL_INTERVAL
+    while True:
+        try:
+            ids = source.wait_for_ids(MAX_POLL_INTERVAL)
+            if ids:
+                ids = collect_burst(source, ids)
+                started = time.time()
+                ce.classify_candidates(service, ce.fetch_candidates(service, ids))
+                print(f"⚡ Classified {len(ids)} new emails in {time.time() - started:.1f}s.")
+            # Only now is the position saved, so a crash before this point loses no ids
+            source.commit()
+            backoff = MIN_POLL_INTERVAL
+        except Exception as e:
+            print(f"⚠️ Watch iteration failed ({e}). Retrying in {backoff}s.")
+            source.rollback()
+            time.sleep(backoff)
+            backoff = min(backoff * 2, MAX_POLL_INTERVAL)
+
+def build_source(args, service):
+    if args.source == 'file':
+        return FileSource(args.file)
+    if args.source == 'pubsub':
+        return PubSubSource(service, args.topic, args.subscription)
+    return HistoryPollSource(service)
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify new emails within seconds of their arrival.")
+    parser.add_argument('--source', choices=['history', 'pubsub', 'file'], default='history')
+    parser.add_argument('--file', default=os.path.join('state', 'watch_events.txt'), help="Id file for --source file")
+    parser.add_argument('--topic', help="Pub/Sub topic Gmail publishes to (projects/<p>/topics/<t>)")
+    parser.add_argument('--subscription', help="Pub/Sub pull subscription (projects/<p>/subscriptions/<s>)")
+    args = parser.parse_args()
+    if args.source == 'pubsub' and not (args.topic and args.subscription):
+        parser.error("--source pubsub needs --topic and --subscription")
+
+    service = ce.get_gmail_service()
+    if not service: return
+    ce.ensure_labels_exist(service)
+
+    source = build_source(args, service)
+    print(f"👀 Watching for new emails ({args.source}). Press Ctrl-C to stop.")
+    try:
+        watch(source, service)
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+
+if __name__ == '__main__':
+    main()
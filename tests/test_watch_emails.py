@@ -0,0 +1,56 @@
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+# classify_emails loads the model at import time; the watcher only needs these two calls
+ce = types.ModuleType('classify_emails')
+ce.fetch_candidates = lambda service, ids: [(i, f"subject {i}", "text", 0) for i in ids]
+ce.classify_candidates = lambda service, candidates: None
+sys.modules['classify_emails'] = ce
+
+import watch_emails
+
+
+@pytest.fixture
+def events(tmp_path, monkeypatch):
+    monkeypatch.setattr(watch_emails, 'MICRO_BATCH_WINDOW', 0.2)
+    path = tmp_path / 'events.txt'
+    path.write_text('old-id\n')  # Already there when the watcher starts
+    return path
+
+
+def append(path, text):
+    with open(path, 'a') as f:
+        f.write(text)
+
+
+def test_file_source_burst(events):
+    source = watch_emails.FileSource(str(events), poll_interval=0.01)
+    assert source.wait_for_ids(0.05) == []
+
+    append(events, 'a\nb\npartial')
+    first = source.wait_for_ids(1)
+    append(events, '-id\na\n')
+    assert watch_emails.collect_burst(source, first) == ['a', 'b', 'partial-id']
+
+
+def test_watch_retries_ids_after_a_failure(events, monkeypatch):
+    monkeypatch.setattr(watch_emails.time, 'sleep', lambda seconds: None)
+    source = watch_emails.FileSource(str(events), poll_interval=0.01)
+    append(events, 'x\ny\n')
+
+    calls = []
+    def classify(service, candidates):
+        calls.append([c[0] for c in candidates])
+        if len(calls) == 1:
+            raise ConnectionError("network down")
+        raise KeyboardInterrupt  # Stops the loop after the retry
+    monkeypatch.setattr(ce, 'classify_candidates', classify)
+
+    with pytest.raises(KeyboardInterrupt):
+        watch_emails.watch(source, service=None)
+    assert calls == [['x', 'y'], ['x', 'y']]